@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+# Compare the automatically chosen chunk shape of OpLazyCC with a set of hand
+# tuned chunk shapes, for each of the standard synthetic volumes.
+
+from timeit import repeat
+
+from lazycc import OpLazyCC
+
+from lazyflow.graph import Graph
+
+from syntheticVolumes import standardVolumes
+
+
+HAND_TUNED = [(25, 25, 25), (50, 50, 50), (100, 100, 100), (200, 200, 200),
+              (200, 200, 10), (200, 20, 20)]
+
+
+# time a full volume request (best of nRuns, fresh operator for each run)
+def timeFullVolume(vol, chunkShape, nRuns=3):
+    def run():
+        op = OpLazyCC(graph=Graph())
+        op.Input.setValue(vol)
+        if chunkShape is not None:
+            op.ChunkShape.setValue(chunkShape)
+        op.Output[...].wait()
+        return op.Output.meta.chunkShape
+    shape = run()
+    return min(repeat(run, repeat=nRuns, number=1)), shape
+
+
+if __name__ == "__main__":
+    for name, vol in standardVolumes():
+        print("===========================")
+        print(name)
+        auto, autoShape = timeFullVolume(vol, None)
+        results = [(timeFullVolume(vol, cs)[0], cs) for cs in HAND_TUNED]
+        for res, cs in sorted(results):
+            print("  {:<16} {:8.3f}ms".format(cs, res*1000))
+        best, bestShape = min(results)
+        print("  automatic: {} {:.3f}ms ({:.2f}x the best hand tuned shape "
+              "{})".format(autoShape, auto*1000, auto/best, bestShape))
+    print("===========================")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+# Time the access pattern of OpLazyCC on the LabelStore, with and without the
+# cache of decompressed chunks: each dense chunk is stored once, its faces
+# are read for merging with the neighbours in the order of region growing,
+# then the chunk is mapped to final labels. Needs only numpy.
+
+from timeit import repeat
+
+import numpy as np
+
+from lazycc._labelStore import LabelStore
+
+
+# dense local labels: blocks of a few labels per chunk
+def makeLabels(chunkShape, numLabels=200, seed=0):
+    rng = np.random.RandomState(seed)
+    coarse = rng.randint(1, numLabels+1,
+                         size=tuple(max(1, s//8) for s in chunkShape))
+    labels = coarse.repeat(8, axis=0).repeat(8, axis=1).repeat(8, axis=2)
+    return np.ascontiguousarray(labels[tuple(slice(0, s)
+                                             for s in chunkShape)],
+                                dtype=np.uint32)
+
+
+# the faces of a chunk, as slicings relative to the chunk
+def faces(chunkShape):
+    for axis in range(3):
+        for pos in (0, chunkShape[axis]-1):
+            key = [slice(None)]*3
+            key[axis] = slice(pos, pos+1)
+            yield tuple(key)
+
+
+def run(store, labels, gridShape):
+    mapping = np.arange(labels.max()+1, dtype=np.uint32)
+    out = np.empty(labels.shape, dtype=np.uint32)
+    for chunk in np.ndindex(*gridShape):
+        store.store(chunk, labels)
+    for chunk in np.ndindex(*gridShape):
+        for key in faces(labels.shape):
+            store.read(chunk, key)
+        store.mapInto(chunk, None, mapping, out)
+
+
+if __name__ == "__main__":
+    gridShape = (4, 4, 4)
+    for chunkShape in [(64, 64, 64), (200, 200, 10)]:
+        labels = makeLabels(chunkShape)
+        print("===========================")
+        print("chunk shape {}, {} chunks".format(chunkShape,
+                                                np.prod(gridShape)))
+        for name, size in (("no decoded cache", 0),
+                           ("decoded cache", None)):
+            def bench():
+                if size is None:
+                    store = LabelStore()
+                else:
+                    store = LabelStore(decodedChunks=size)
+                run(store, labels, gridShape)
+                return store
+            store = bench()
+            t = min(repeat(bench, repeat=3, number=1))
+            print("  {:<18} {:8.1f}ms, compressed {:6.2f}MB, decoded "
+                  "{:6.2f}MB".format(name, t*1000, store.data_bytes/2.0**20,
+                                     store.decoded_bytes/2.0**20))
+    print("===========================")
@@ -13,27 +13,35 @@ import numpy as np
 import vigra
 
 
-if __name__ == "__main__":
-    N = 200
-    shape = (64, 64)
-
+# faces of two adjacent chunks, the 'contiguous' faces are unstrided (in
+# vigra order), the 'strided' faces are hyperplanes of 3d chunks as they
+# come out of the chunk cache
+def makeFaces(shape, strided=False):
     labelType = np.uint32
+    data = np.random.randint(255, size=shape).astype(np.uint8)
 
-    # arrays must be in vigra order for cMergeLabelsRaw to work
-    left = np.zeros(shape, dtype=np.uint8).transpose()
-    right = np.zeros(shape, dtype=np.uint8).transpose()
-
-    left[:] = np.random.randint(255, size=shape).astype(np.uint8)
-    right[:] = left
-    #right[:] = np.random.randint(255, size=shape).astype(np.uint8)
-
-    labels_left = np.zeros(left.shape, dtype=labelType).transpose()
-    labels_right = np.zeros(right.shape, dtype=labelType).transpose()
+    if strided:
+        # last hyperplane along y of the left chunk, first of the right chunk
+        left = np.zeros((shape[0], 8, shape[1]), dtype=np.uint8)
+        right = np.zeros_like(left)
+        left[:, -1, :] = data
+        right[:, 0, :] = data
+        labels_left = np.zeros(left.shape, dtype=labelType)
+        labels_right = np.zeros(right.shape, dtype=labelType)
+        left, right = left[:, -1, :], right[:, 0, :]
+        labels_left = labels_left[:, -1, :]
+        labels_right = labels_right[:, 0, :]
+    else:
+        left = np.zeros(shape, dtype=np.uint8).transpose()
+        right = np.zeros(shape, dtype=np.uint8).transpose()
+        labels_left = np.zeros(left.shape, dtype=labelType).transpose()
+        labels_right = np.zeros(right.shape, dtype=labelType).transpose()
+        data = data.transpose()
+        left[:] = data
+        right[:] = data
 
-    #res = timeit('labelImage(right)', setup='from vigra.analysis import labelImage; from __main__ import right', number=N)
-    #print(res)
-    vigra.analysis.labelImage(left, out=labels_left)
-    vigra.analysis.labelImage(right, out=labels_right)
+    labels_left[:] = vigra.analysis.labelImage(left)
+    labels_right[:] = vigra.analysis.labelImage(right)
 
     max_left = np.max(labels_left)
     max_right = np.max(labels_right)
@@ -41,17 +49,27 @@ if __name__ == "__main__":
     map_left = np.arange(max_left+1, dtype=labelType)
     map_right = np.arange(max_right+1, dtype=labelType) + max_left
     map_right[0] = 0
+    return left, right, labels_left, labels_right, map_left, map_right
+
+
+if __name__ == "__main__":
+    N = 200
+    shape = (64, 64)
 
     setup = "from __main__ import {}, "\
             "left, right, labels_left, labels_right, "\
-            "map_left, map_right, max_left, max_right, UnionFindArray;"\
+            "map_left, map_right, UnionFindArray;"\
             "uf = UnionFindArray(map_right)"
     cmd = "{}(left, right, labels_left, labels_right, "\
           "map_left, map_right, uf)"
 
-    for impl in ["pyMergeLabels", "cMergeLabels", "cMergeLabelsRaw"]:
-        print("{} for shape {}:".format(cmd.format(impl), left.shape))
-        res = repeat(cmd.format(impl), setup=setup.format(impl),
-                     repeat=3, number=N)
-        print("    " + " ".join(["{:.3f}s".format(r) for r in res]))
-
+    for strided in (False, True):
+        left, right, labels_left, labels_right, map_left, map_right = \
+            makeFaces(shape, strided=strided)
+        print("===== {} faces =====".format("strided" if strided
+                                            else "contiguous"))
+        for impl in ["pyMergeLabels", "cMergeLabels", "cMergeLabelsRaw"]:
+            print("{} for shape {}:".format(cmd.format(impl), left.shape))
+            res = repeat(cmd.format(impl), setup=setup.format(impl),
+                         repeat=3, number=N)
+            print("    " + " ".join(["{:.3f}s".format(r) for r in res]))
@@ -36,9 +36,13 @@ def runSingleBenchmark(op, op2, vol, chunkShape):
     op.ChunkShape.setValue(chunkShape)
     nChunks = np.prod(np.divide(vol.shape, chunkShape))
 
+    op.resetStatistics()
     res = timeit("out = op.Output[...].wait()",
                  setup="from __main__ import op", number=1)
     print("  Took {:.3f}ms for full volume, {} chunks".format(res*1000, nChunks))
+    stats = op.getStatistics()
+    print("    {} upstream requests, {:.3f}ms waiting for upstream".format(
+        stats["upstreamRequests"], stats["timeUpstream"]*1000))
 
     op.Input.setValue(vol)
     op.ChunkShape.setValue(vol.shape)
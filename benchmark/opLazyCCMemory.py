@@ -2,59 +2,227 @@
 # coding: utf-8
 # author: Markus Döring
 
+# Memory regression benchmark for OpLazyCC
+#
+# Every (volume, chunk shape) combination is run in a fresh process. For each
+# of the phases labeling, merging and mapping we record
+#     * the peak resident set size during the phase, relative to the resident
+#       set size at its start (the peak is reset before each phase, which
+#       needs linux >= 4.0)
+#     * the peak of traced allocations (tracemalloc, skipped if the module is
+#       not available)
+# and, after the request, the size of the operator's data structures. All
+# values are reported in bytes per voxel of the input volume. The script exits
+# with a non-zero status if any value exceeds its threshold or could not be
+# measured (nan).
 
-from timeit import timeit, repeat
+import sys
+import gc
 import resource
-import psutil
-import objgraph
-from guppy import hpy
+import multiprocessing
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2.7 needs the pytracemalloc patches for this module
+    tracemalloc = None
 
 from lazycc import OpLazyCC
 
 from lazyflow.graph import Graph
-from lazyflow.operators import OpLabelVolume
+from lazyflow.rtype import SubRegion
 
-import gc
-from pprint import pprint
+from syntheticVolumes import VOLUME_NAMES, makeVolume
 
-import numpy as np
-import vigra
 
-hp = hpy()
+CHUNK_SHAPES = [(50, 50, 50), (64, 64, 64), (200, 200, 10)]
+PHASES = ["labeling", "merging", "mapping"]
 
+# upper bounds in bytes per voxel
+THRESHOLDS = {
+    # phases, the output array of the mapping phase is 4 bytes per voxel
+    "labeling rss": 2.0,
+    "labeling traced": 1.0,
+    "merging rss": 1.0,
+    "merging traced": 0.5,
+    "mapping rss": 6.0,
+    "mapping traced": 5.0,
+    # data structures that survive the request
+    "_cache": 4.0,
+    "union find": 0.5,
+    "bookkeeping": 0.5,
+}
 
-def profile(fun):
-    def wrapped(*args, **kwargs):
-        x = fun(*args, **kwargs)
-        gc.collect()
-        #objgraph.show_most_common_types()
-        return x
-    return wrapped
+
+# current resident set size of this process in bytes
+def _currentRSS():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+# reset the peak resident set size of this process to the current one
+# (ru_maxrss can't be reset, and never decreases)
+def _resetPeakRSS():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+# peak resident set size since the last _resetPeakRSS(), in bytes
+def _peakRSS():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                # reported in kilobytes
+                return int(line.split()[1]) * 1024
+    return np.nan
+
+
+def _resetTraced():
+    if tracemalloc is None:
+        return
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()
+
+
+def _peakTraced():
+    return tracemalloc.get_traced_memory()[1]
+
+
+# approximate size of (nested) containers in bytes
+def _deepSizeOf(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deepSizeOf(k, seen) + _deepSizeOf(v, seen)
+                    for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deepSizeOf(x, seen) for x in obj)
+    return size
 
 
-@profile
-def runSingleBenchmark(op, vol, chunkShape):
-    before = hp.heap()
+def _unionFindBytes(uf):
+    if hasattr(uf, "_map"):
+        # pure python mockup
+        return _deepSizeOf(uf._map)
+    if not hasattr(uf, "nextFreeIndex"):
+        return 0
+    return int(uf.nextFreeIndex()) * np.dtype(np.uint32).itemsize
+
+
+def _bookkeepingBytes(op):
+    structures = [op._numIndices, op._globalLabelOffset, op._isFinal,
+                  op._isEmpty,
+                  op._mergeMap, op._globalToFinal, op._finalLabels,
+                  op._labelIterators,
+                  op._chunk_locks, op._manager._managedLabels]
+    return sum(_deepSizeOf(s) for s in structures)
+
+
+## run all phases for one volume and chunk shape
+# @returns OrderedDict of measurements in bytes per voxel
+def runSingleBenchmark(volumeName, chunkShape):
+    vol = makeVolume(volumeName)
+    nVoxels = float(vol.size)
+
+    op = OpLazyCC(graph=Graph())
     op.Input.setValue(vol)
     op.ChunkShape.setValue(chunkShape)
-    op.Output[...].wait()
-    after = hp.heap()
-    leftover = after - before
-    print(leftover)
+
+    # the phases are run on OpLazyCC's internals, which work in 'txyzc'
+    shape = op._shape
+    roi = SubRegion(op.Input, start=(0,)*len(shape), stop=shape)
+    chunks = op._roiToChunkIndex(roi)
+
+    def labeling():
+        for chunk in chunks:
+            op._label(chunk)
+
+    def merging():
+        others = set()
+        for chunk in chunks:
+            others |= op.growRegion(chunk)
+        op._manager.waitFor(others)
+
+    def mapping():
+        result = np.zeros(shape, dtype=op.Output.meta.dtype)
+        op._mapArray(roi, result)
+        return result
+
+    res = OrderedDict()
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    for name, phase in zip(PHASES, (labeling, merging, mapping)):
+        gc.collect()
+        _resetTraced()
+        rssBefore = _currentRSS()
+        _resetPeakRSS()
+        phase()
+        res[name + " rss"] = (_peakRSS() - rssBefore)/nVoxels
+        if tracemalloc is not None:
+            res[name + " traced"] = _peakTraced()/nVoxels
+    if tracemalloc is not None:
+        tracemalloc.stop()
+
+    res["_cache"] = (op._cache.data_bytes +
+                     op._cache.decoded_bytes)/nVoxels
+    res["union find"] = _unionFindBytes(op._uf)/nVoxels
+    res["bookkeeping"] = _bookkeepingBytes(op)/nVoxels
+    return res
+
+
+def _runInSubprocess(args):
+    return runSingleBenchmark(*args)
 
 
 if __name__ == "__main__":
-    nRuns = 1
-    chunkShape = (50, 50, 50)
-    vol = np.zeros((200, 200, 200))
-    vol = vol.astype(np.uint8)
-    vol = vigra.taggedView(vol, axistags='xyz')
-    vol[:60, :60, :60] = 1
-
-    for i in range(nRuns):
-        op = OpLazyCC(graph=Graph())
-        #print("===========================")
-        #print("Huge objects {}".format(i))
-        runSingleBenchmark(op, vol, chunkShape)
-        #print("===========================")
+    parser = ArgumentParser(description="memory regression benchmark for "
+                                        "OpLazyCC")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="factor applied to all thresholds")
+    args = parser.parse_args()
+
+    if tracemalloc is None:
+        print("WARNING: tracemalloc not available, traced values are "
+              "skipped")
+
+    failures = []
+    for volumeName in VOLUME_NAMES:
+        print("===========================")
+        print(volumeName)
+        for chunkShape in CHUNK_SHAPES:
+            # fresh process per run, nothing of earlier runs is resident
+            pool = multiprocessing.Pool(processes=1)
+            res = pool.apply(_runInSubprocess, ((volumeName, chunkShape),))
+            pool.close()
+            pool.join()
+
+            print("  chunk shape {}:".format(chunkShape))
+            for key, value in res.items():
+                limit = THRESHOLDS[key]*args.tolerance
+                # a value that could not be measured must not pass
+                exceeded = np.isnan(value) or value > limit
+                print("    {:<16} {:8.3f} B/voxel (limit {:.3f}){}".format(
+                    key, value, limit, "  <-- EXCEEDED" if exceeded else ""))
+                if exceeded:
+                    failures.append((volumeName, chunkShape, key))
+    print("===========================")
 
+    if failures:
+        print("{} threshold(s) exceeded:".format(len(failures)))
+        for volumeName, chunkShape, key in failures:
+            print("  {}, {}: {}".format(volumeName, chunkShape, key))
+        sys.exit(1)
+    print("All thresholds met.")
@@ -13,8 +13,15 @@ import numpy as np
 import vigra
 
 import cProfile, pstats, StringIO
+from argparse import ArgumentParser
 
 if __name__ == "__main__":
+    parser = ArgumentParser(description="profile OpLazyCC")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="write a timeline of all threads to FILE (Chrome "
+                             "trace event format) instead of profiling")
+    args = parser.parse_args()
+
     vol = np.zeros((200, 200, 200))
     vol = vol.astype(np.uint8)
     vol = vigra.taggedView(vol, axistags='xyz')
@@ -25,6 +32,15 @@ if __name__ == "__main__":
     op.Input.setValue(vol)
     op.ChunkShape.setValue((50, 50, 50))
 
+    if args.trace is not None:
+        op.startTracing()
+        op.Output[...].wait()
+        op.stopTracing()
+        op.writeTrace(args.trace)
+        print("Wrote trace to {}, open it with chrome://tracing".format(
+            args.trace))
+        raise SystemExit(0)
+
     pr = cProfile.Profile()
     pr.enable()
     # start calculation #
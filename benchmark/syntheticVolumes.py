@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+import numpy as np
+import vigra
+
+
+# the volumes used throughout the OpLazyCC benchmarks, see also
+# opLazyCCBenchmark.py
+VOLUME_NAMES = ["Huge Objects", "No Objects", "Sparse Objects"]
+
+
+## create one of the standard synthetic volumes
+# @param name one of VOLUME_NAMES
+# @param shape spatial shape of the volume, in 'xyz' order
+# @returns a uint8 VigraArray with axistags 'xyz'
+def makeVolume(name, shape=(200, 200, 200)):
+    vol = np.zeros(shape, dtype=np.uint8)
+    vol = vigra.taggedView(vol, axistags='xyz')
+    if name == "Huge Objects":
+        vol[:60, :60, :60] = 1
+    elif name == "No Objects":
+        pass
+    elif name == "Sparse Objects":
+        # want to have few objects on boundaries (250*2 elements on boundary)
+        # chance of 1/4 of an object to lie on boundary
+        # fixed seed, so that runs are comparable
+        rng = np.random.RandomState(0)
+        vol[:] = rng.randint(2000, size=vol.shape) == 0
+    else:
+        raise ValueError("Unknown volume '{}'".format(name))
+    return vol
+
+
+## iterate over all standard volumes
+# @returns generator of (name, volume) pairs
+def standardVolumes(shape=(200, 200, 200)):
+    for name in VOLUME_NAMES:
+        yield name, makeVolume(name, shape=shape)
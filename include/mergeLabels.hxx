@@ -15,8 +15,46 @@
 
 #include <vigra/timing.hxx>
 
+#include <vector>
+#include <utility>
+#include <algorithm>
+
 namespace vigra {
 
+// sort and deduplicate the label pairs of a face, then join the
+// corresponding global labels (each pair touches the union find only once)
+template <class LabelType>
+inline void
+mergeLabelPairs(std::vector<std::pair<LabelType, LabelType> > & pairs,
+                MultiArrayView<1, LabelType> const & leftMap,
+                MultiArrayView<1, LabelType> const & rightMap,
+                UnionFindArray<LabelType> & unionFind)
+{
+    std::sort(pairs.begin(), pairs.end());
+    pairs.erase(std::unique(pairs.begin(), pairs.end()), pairs.end());
+
+    LabelType * lmap = leftMap.data();
+    LabelType * rmap = rightMap.data();
+    typename std::vector<std::pair<LabelType, LabelType> >::const_iterator it;
+    for (it = pairs.begin(); it != pairs.end(); ++it)
+    {
+        unionFind.makeUnion(lmap[it->first], rmap[it->second]);
+    }
+}
+
+// append a pair of adjacent labels, unless it is the same as the last one
+// (objects usually cover runs of voxels along the innermost dimension)
+template <class LabelType>
+inline void
+addLabelPair(std::vector<std::pair<LabelType, LabelType> > & pairs,
+             LabelType left, LabelType right)
+{
+    if (pairs.empty() || pairs.back().first != left || pairs.back().second != right)
+    {
+        pairs.push_back(std::make_pair(left, right));
+    }
+}
+
 template <class PixelIterator, class LabelIterator, class LabelType,
           class Shape, class EqualityFunctor>
 inline void
@@ -25,9 +63,7 @@ mergeLabels(PixelIterator left,
             LabelIterator leftLabels,
             LabelIterator rightLabels,
             const Shape & shape,
-            MultiArrayView<1, LabelType> const & leftMap,
-            MultiArrayView<1, LabelType> const & rightMap,
-            UnionFindArray<LabelType> & unionFind,
+            std::vector<std::pair<LabelType, LabelType> > & pairs,
             EqualityFunctor equal, int n
            )
 {
@@ -38,20 +74,18 @@ mergeLabels(PixelIterator left,
             i < shape[n];
             left.incDim(n), right.incDim(n), leftLabels.incDim(n), rightLabels.incDim(n), i++)
         {
-            mergeLabels(left, right, leftLabels, rightLabels, shape, leftMap, rightMap, unionFind, equal, n-1);
+            mergeLabels(left, right, leftLabels, rightLabels, shape, pairs, equal, n-1);
         }
     }
     else
     {
-        LabelType * lmap = leftMap.data();
-        LabelType * rmap = rightMap.data();
         for(left.resetDim(n), right.resetDim(n), leftLabels.resetDim(n), rightLabels.resetDim(n);
             i < shape[n];
             left.incDim(n), right.incDim(n), leftLabels.incDim(n), rightLabels.incDim(n), i++)
         {
             if (equal(*left, *right) && *leftLabels>0)
             {
-                unionFind.makeUnion(lmap[*leftLabels], rmap[*rightLabels]);
+                addLabelPair<LabelType>(pairs, *leftLabels, *rightLabels);
             }
         }
     }
@@ -66,24 +100,44 @@ mergeLabels(MultiArrayView<N, PixelType> const & left,
             MultiArrayView<N, LabelType> const & rightLabels,
             MultiArrayView<1, LabelType> const & leftMap,
             MultiArrayView<1, LabelType> const & rightMap,
-            UnionFindArray<LabelType> & unionFind)
+            UnionFindArray<LabelType> & unionFind,
+            std::vector<std::pair<LabelType, LabelType> > & pairs)
 {
     vigra_precondition(left.shape() == right.shape(), "mergeLabels(): Data arrays shape mismatch");
     vigra_precondition(leftLabels.shape() == rightLabels.shape(), "mergeLabels(): Label arrays shape mismatch");
     vigra_precondition(leftLabels.shape() == left.shape(), "mergeLabels(): Labels/Data shape mismatch");
     vigra_precondition(leftMap.isUnstrided() && rightMap.isUnstrided(), "maps must be unstrided");
 
+    pairs.clear();
     typename MultiArrayView<N, PixelType>::difference_type strideOrder = left.strideOrdering();
     MultiArrayView<N, PixelType> leftReordered = left.transpose(strideOrder);
     mergeLabels(leftReordered.begin(), right.transpose(strideOrder).begin(),
                 leftLabels.transpose(strideOrder).begin(), rightLabels.transpose(strideOrder).begin(),
-                leftReordered.shape(),
-                leftMap, rightMap, unionFind,
+                leftReordered.shape(), pairs,
                 std::equal_to<PixelType>(), N-1);
-    
+    mergeLabelPairs(pairs, leftMap, rightMap, unionFind);
+}
+
+// same as above, without returning the pairs of local labels
+template <int N, class PixelType, class LabelType>
+void
+mergeLabels(MultiArrayView<N, PixelType> const & left,
+            MultiArrayView<N, PixelType> const & right,
+            MultiArrayView<N, LabelType> const & leftLabels,
+            MultiArrayView<N, LabelType> const & rightLabels,
+            MultiArrayView<1, LabelType> const & leftMap,
+            MultiArrayView<1, LabelType> const & rightMap,
+            UnionFindArray<LabelType> & unionFind)
+{
+    std::vector<std::pair<LabelType, LabelType> > pairs;
+    mergeLabels<N, PixelType, LabelType>(left, right, leftLabels, rightLabels,
+                                         leftMap, rightMap, unionFind, pairs);
 }
 
 
+// raw pointer version of mergeLabels for 1 to 3 dimensions
+// The arrays may have arbitrary strides, they are traversed in the stride
+// order of the left data array with precomputed offsets per line.
 template <int N, class PixelType, class LabelType>
 void
 mergeLabelsRaw(MultiArrayView<N, PixelType> const & left,
@@ -92,15 +146,28 @@ mergeLabelsRaw(MultiArrayView<N, PixelType> const & left,
             MultiArrayView<N, LabelType> const & rightLabels,
             MultiArrayView<1, LabelType> const & leftMap,
             MultiArrayView<1, LabelType> const & rightMap,
-            UnionFindArray<LabelType> & unionFind)
+            UnionFindArray<LabelType> & unionFind,
+            std::vector<std::pair<LabelType, LabelType> > & pairs)
 {
+    vigra_precondition(N >= 1 && N <= 3, "mergeLabelsRaw(): only 1 to 3 dimensions are supported");
     vigra_precondition(left.shape() == right.shape(), "mergeLabels(): Data arrays shape mismatch");
     vigra_precondition(leftLabels.shape() == rightLabels.shape(), "mergeLabels(): Label arrays shape mismatch");
     vigra_precondition(leftLabels.shape() == left.shape(), "mergeLabels(): Labels/Data shape mismatch");
     vigra_precondition(leftMap.isUnstrided() && rightMap.isUnstrided(), "map arrays must be unstrided");
-    vigra_precondition(left.isUnstrided() && right.isUnstrided(), "pixel arrays must be unstrided");
-    vigra_precondition(leftLabels.isUnstrided() && rightLabels.isUnstrided(), "label arrays must be unstrided");
     
+    // shape and strides in ascending stride order, padded to 3 dimensions
+    typename MultiArrayShape<N>::type order = left.strideOrdering();
+    MultiArrayIndex shape[3] = {1, 1, 1};
+    MultiArrayIndex ls[3] = {0, 0, 0}, rs[3] = {0, 0, 0};
+    MultiArrayIndex lls[3] = {0, 0, 0}, rls[3] = {0, 0, 0};
+    for (int k=0; k < N; k++)
+    {
+        shape[k] = left.shape(order[k]);
+        ls[k] = left.stride(order[k]);
+        rs[k] = right.stride(order[k]);
+        lls[k] = leftLabels.stride(order[k]);
+        rls[k] = rightLabels.stride(order[k]);
+    }
     
     PixelType* ldata = left.data();
     PixelType* rdata = right.data();
@@ -108,24 +175,43 @@ mergeLabelsRaw(MultiArrayView<N, PixelType> const & left,
     LabelType* lldata = leftLabels.data();
     LabelType* rldata = rightLabels.data();
     
-    LabelType* lmdata = leftMap.data();
-    LabelType* rmdata = rightMap.data();
-    
-    typename MultiArrayView<N, PixelType>::difference_type_1 end = left.size();
-    
-    for (int i=0; i < end; i++)
+    pairs.clear();
+    for (MultiArrayIndex z=0; z < shape[2]; z++)
     {
-        if(ldata[i] == rdata[i])
+        for (MultiArrayIndex y=0; y < shape[1]; y++)
         {
-            if(lldata[i] > 0)
+            // start of the current line in each array
+            PixelType* lp = ldata + y*ls[1] + z*ls[2];
+            PixelType* rp = rdata + y*rs[1] + z*rs[2];
+            LabelType* llp = lldata + y*lls[1] + z*lls[2];
+            LabelType* rlp = rldata + y*rls[1] + z*rls[2];
+            for (MultiArrayIndex x=0; x < shape[0];
+                 x++, lp += ls[0], rp += rs[0], llp += lls[0], rlp += rls[0])
             {
-                unionFind.makeUnion(lmdata[lldata[i]],
-                                    rmdata[rldata[i]]);
+                if(*lp == *rp && *llp > 0)
+                {
+                    addLabelPair<LabelType>(pairs, *llp, *rlp);
+                }
             }
         }
     }
-    
-    
+    mergeLabelPairs(pairs, leftMap, rightMap, unionFind);
+}
+
+// same as above, without returning the pairs of local labels
+template <int N, class PixelType, class LabelType>
+void
+mergeLabelsRaw(MultiArrayView<N, PixelType> const & left,
+            MultiArrayView<N, PixelType> const & right,
+            MultiArrayView<N, LabelType> const & leftLabels,
+            MultiArrayView<N, LabelType> const & rightLabels,
+            MultiArrayView<1, LabelType> const & leftMap,
+            MultiArrayView<1, LabelType> const & rightMap,
+            UnionFindArray<LabelType> & unionFind)
+{
+    std::vector<std::pair<LabelType, LabelType> > pairs;
+    mergeLabelsRaw<N, PixelType, LabelType>(left, right, leftLabels, rightLabels,
+                                            leftMap, rightMap, unionFind, pairs);
 }
 
 
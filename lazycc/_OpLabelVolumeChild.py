@@ -6,7 +6,6 @@ import numpy as np
 import vigra
 
 from lazyflow.operators.opLabelVolume import OpLabelVolume, OpLabelingABC
-from lazyflow.operators import OperatorWrapper, OpMultiArraySlicer
 from lazyflow.rtype import SubRegion
 
 from _opLazyCC import OpLazyCC
@@ -25,51 +24,21 @@ class _OpLazyCCWrapper(OpLabelingABC):
     def __init__(self, *args, **kwargs):
         super(_OpLazyCCWrapper, self).__init__(*args, **kwargs)
 
-        opTimeSlicer = OpMultiArraySlicer(parent=self)
-        opTimeSlicer.AxisFlag.setValue('t')
-        opChannelSlicer = OperatorWrapper(OpMultiArraySlicer, parent=self,
-                                          broadcastingSlotNames=['AxisFlag'])
-        opChannelSlicer.AxisFlag.setValue('c')
-
-        opTimeSlicer.Input.connect(self.Input)
-        opChannelSlicer.Input.connect(opTimeSlicer.Slices)
-        assert opChannelSlicer.Slices.level == 2
-
-        self._opTimeSlicer = opTimeSlicer
-        self._opChannelSlicer = opChannelSlicer
-        self._ops = np.empty((1,), dtype=np.object)
-
-        self._defaultChunkShape = (64, 64, 64)
-
-    def setupOutputs(self):
-        super(_OpLazyCCWrapper, self).setupOutputs()
-        # clear old labeling operators
-        for op in self._ops.flat:
-            if op is not None:
-                op.Input.disconnect()
-        del self._ops
-
-        # create new labeling operators
-        c, t = self.Input.meta.shape[3:]
-        ops = np.empty((c, t), dtype=np.object)
-        for i in range(c):
-            for j in range(t):
-                op = OpLazyCC(parent=self)
-                # reverse order because the outermost [] corresponds to the
-                # index that was sliced last, i.e. c
-                op.Input.connect(self._opChannelSlicer.Slices[j][i])
-                op.ChunkShape.setValue(self._defaultChunkShape)
-                # set background values
-                #TODO
-                ops[i, j] = op
-        self._ops = ops
+        # OpLazyCC handles the axes 't' and 'c' natively, one operator (with
+        # one cache and one union find) serves all time steps and channels
+        # ChunkShape is left unset, OpLazyCC chooses one
+        # set background values
+        #TODO
+        op = OpLazyCC(parent=self)
+        op.Input.connect(self.Input)
+        self._op = op
 
     def _label3d(self, roi, _, result):
-        currOp = self._ops[roi.start[3], roi.start[4]]
-        newRoi = SubRegion(currOp.Output,
-                           start=roi.start[:3], stop=roi.stop[:3])
-        req = currOp.Output.get(newRoi)
-        req.writeInto(result)
+        # roi covers a single time step and channel of the 'xyzct' input,
+        # result is the corresponding 'xyz' view
+        newRoi = SubRegion(self._op.Output, start=roi.start, stop=roi.stop)
+        req = self._op.Output.get(newRoi)
+        req.writeInto(result.view(np.ndarray)[..., np.newaxis, np.newaxis])
         req.block()
 
 
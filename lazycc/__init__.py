@@ -33,8 +33,9 @@ def _dtypeFromType(T):
         raise ValueError()
 
 
-from _lazycc_cxx import mergeLabels
+from _lazycc_cxx import mergeLabels, mergeLabelsRaw
 #from _merge import mergeLabels
 from _opLazyCC import OpLazyCC
 from _opBlockwiseCC import OpBlockwiseCC
 from _tools import LabelGraph, index2dim, dim2Index
+from _slabLabeling import labelSlabs
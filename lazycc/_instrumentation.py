@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+import os
+import time
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock, current_thread
+
+
+## thread safe collection of counters and timers
+#
+# Counting and timing is cheap (one uncontended lock per call), such that the
+# statistics can stay enabled in production.
+class RuntimeStatistics(object):
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = defaultdict(int)
+        self._timers = defaultdict(float)
+
+    ## increase counter 'name' by n
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    ## add 'seconds' to timer 'name'
+    def addTime(self, name, seconds):
+        with self._lock:
+            self._timers[name] += seconds
+
+    ## context manager that adds the time spent inside to timer 'name'
+    @contextmanager
+    def timer(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.time() - start)
+
+    ## get a copy of all counters and timers (timers are in seconds)
+    def snapshot(self):
+        with self._lock:
+            d = dict(self._counters)
+            d.update(self._timers)
+        return d
+
+    ## set all counters and timers to 0
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+
+## records per-thread time spans in Chrome's trace event format
+#
+# Tracing is disabled by default, a disabled recorder does nothing but
+# return a no-op context manager in span(). The output of write() can be
+# inspected with chrome://tracing or any other trace event viewer.
+class TraceRecorder(object):
+
+    def __init__(self):
+        self._lock = Lock()
+        self._events = []
+        self._threads = set()
+        self._origin = time.time()
+        self.enabled = False
+
+    ## start recording, all previously recorded events are discarded
+    def start(self):
+        with self._lock:
+            self._events = []
+            self._threads = set()
+            self._origin = time.time()
+        self.enabled = True
+
+    ## stop recording, the events are kept until the next call to start()
+    def stop(self):
+        self.enabled = False
+
+    ## context manager that records the time spent inside as a span
+    # @param name name of the span, e.g. the method name
+    # @param args additional information, e.g. the chunk index
+    def span(self, name, **args):
+        if not self.enabled:
+            return _noSpan
+        return _Span(self, name, args)
+
+    ## record a span with known start and stop time (from time.time())
+    def addSpan(self, name, start, stop, **args):
+        if not self.enabled:
+            return
+        thread = current_thread()
+        event = {"name": name, "ph": "X", "pid": os.getpid(),
+                 "tid": thread.ident,
+                 "ts": (start - self._origin)*1e6,
+                 "dur": (stop - start)*1e6,
+                 "args": args}
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self._events.append({"name": "thread_name", "ph": "M",
+                                     "pid": event["pid"], "tid": thread.ident,
+                                     "args": {"name": thread.name}})
+            self._events.append(event)
+
+    ## write all recorded events to a JSON file
+    def write(self, filename):
+        with self._lock:
+            events = list(self._events)
+        with open(filename, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f,
+                      default=_toJSON)
+
+
+# chunk indices may contain numpy integers
+def _toJSON(obj):
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+class _Span(object):
+
+    def __init__(self, recorder, name, args):
+        self._recorder = recorder
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self._recorder.addSpan(self._name, self._start, time.time(),
+                               **self._args)
+
+
+class _NoSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+_noSpan = _NoSpan()
+
+
+## lock wrapper that records the time spent waiting for the lock
+#
+# The wrapper is cheap to construct, so it can be wrapped around existing
+# locks on the fly, e.g. around a lock taken from a defaultdict. If a
+# TraceRecorder is given, each wait is recorded as a span, too.
+class TimedLock(object):
+
+    def __init__(self, lock, stats, name, tracer=None, **args):
+        self._lock = lock
+        self._stats = stats
+        self._name = name
+        self._tracer = tracer
+        self._args = args
+
+    def acquire(self, blocking=True):
+        start = time.time()
+        acquired = self._lock.acquire(blocking)
+        stop = time.time()
+        self._stats.addTime(self._name, stop - start)
+        if self._tracer is not None:
+            self._tracer.addSpan(self._name, start, stop, **self._args)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+import zlib
+import numpy as np
+
+from collections import OrderedDict
+from threading import Lock
+
+# chunks with a smaller fraction of foreground voxels are run-length encoded
+_SPARSE_OCCUPANCY = 0.1
+
+# number of decompressed dense chunks that are kept, a chunk is read once per
+# face and once for mapping, usually shortly after each other
+_DECODED_CHUNKS = 16
+
+
+# the smallest unsigned integer type that can hold labels 0..numLabels
+def _storageType(numLabels):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if numLabels <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError("Too many labels in one chunk: {}".format(numLabels))
+
+
+## a chunk of local labels, compressed in the narrowest possible data type
+class _DenseChunk(object):
+
+    def __init__(self, labels, numLabels=None):
+        if numLabels is None:
+            numLabels = int(labels.max()) if labels.size > 0 else 0
+        self.numLabels = numLabels
+        self.shape = labels.shape
+        self.dtype = _storageType(numLabels)
+        data = np.ascontiguousarray(labels, dtype=self.dtype)
+        # fastest compression level, labels compress well anyway
+        # (compressed straight from the array's buffer, without a copy)
+        self._data = zlib.compress(data.data, 1)
+
+    def read(self, key=None):
+        data = np.frombuffer(zlib.decompress(self._data), dtype=self.dtype)
+        data = data.reshape(self.shape)
+        if key is not None:
+            data = data[key]
+        return data
+
+    @property
+    def nbytes(self):
+        return len(self._data)
+
+
+## a chunk of local labels, stored as runs of foreground voxels
+#
+# The runs are taken along the flattened (C order) chunk, only runs of
+# non-zero labels are stored. Reading and mapping cost time proportional to
+# the foreground in the chunk, not to its size.
+class _SparseChunk(object):
+
+    def __init__(self, labels, numLabels=None):
+        self.shape = labels.shape
+        flat = np.ascontiguousarray(labels).ravel()
+        change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+        starts = np.concatenate(([0], change))
+        lengths = np.diff(np.concatenate((starts, [flat.size])))
+        values = flat[starts]
+        foreground = values > 0
+        values = values[foreground]
+        # the runs are few, finding the highest label costs nothing compared
+        # to finding them
+        if numLabels is None:
+            numLabels = int(values.max()) if values.size > 0 else 0
+        self.numLabels = numLabels
+        self.dtype = _storageType(numLabels)
+        self._starts = starts[foreground].astype(np.uint32)
+        self._lengths = lengths[foreground].astype(np.uint32)
+        self._values = values.astype(self.dtype)
+
+    # flat indices and labels of all foreground voxels
+    def _expand(self):
+        lengths = self._lengths.astype(np.intp)
+        n = lengths.sum()
+        # position of each voxel in its run
+        runOffsets = np.cumsum(lengths) - lengths
+        indices = np.arange(n) - np.repeat(runOffsets, lengths)
+        indices += np.repeat(self._starts.astype(np.intp), lengths)
+        return indices, np.repeat(self._values, lengths)
+
+    # coordinates (relative to the key) and labels of all foreground voxels
+    # inside the key
+    def _select(self, key):
+        indices, values = self._expand()
+        coords = np.unravel_index(indices, self.shape)
+        if key is None:
+            return coords, values
+        inside = np.ones(values.shape, dtype=bool)
+        start = []
+        for dim, s, c in zip(self.shape, key, coords):
+            a, b, step = s.indices(dim)
+            assert step == 1, "only contiguous slicings are supported"
+            inside &= (c >= a) & (c < b)
+            start.append(a)
+        coords = tuple(c[inside] - a for c, a in zip(coords, start))
+        return coords, values[inside]
+
+    def _keyShape(self, key):
+        if key is None:
+            return self.shape
+        return tuple(len(range(*s.indices(dim)))
+                     for dim, s in zip(self.shape, key))
+
+    def read(self, key=None):
+        out = np.zeros(self._keyShape(key), dtype=self.dtype)
+        coords, values = self._select(key)
+        out[coords] = values
+        return out
+
+    def mapInto(self, key, mapping, out):
+        out[:] = 0
+        coords, values = self._select(key)
+        out[coords] = mapping[values]
+
+    @property
+    def nbytes(self):
+        return self._starts.nbytes + self._lengths.nbytes + \
+            self._values.nbytes
+
+
+## storage for the local labels of all chunks
+#
+# Each chunk is stored on its own, compressed, and in the smallest data type
+# that can hold its labels, i.e. uint8 for chunks with less than 256 labels.
+# Labels are widened transparently when they are read. Chunks that are mostly
+# background are run-length encoded instead of compressed. The most recently
+# used compressed chunks are kept decompressed as well, such that reading the
+# faces of a chunk decompresses it only once.
+class LabelStore(object):
+
+    ## @param sparseOccupancy chunks with a smaller fraction of foreground
+    #                         voxels are run-length encoded
+    # @param decodedChunks number of decompressed chunks to keep (0 disables
+    #                      the cache)
+    def __init__(self, sparseOccupancy=_SPARSE_OCCUPANCY,
+                 decodedChunks=_DECODED_CHUNKS):
+        self._chunks = dict()
+        self._sparseOccupancy = sparseOccupancy
+        # chunkIndex -> (chunk, decompressed labels), least recently used
+        # first
+        self._decoded = OrderedDict()
+        self._decodedChunks = decodedChunks
+        self._lock = Lock()
+
+    ## store the local labels of a chunk
+    # The labels are copied, the array can be reused afterwards.
+    # @param chunkIndex index of the chunk
+    # @param labels array of local labels in [0, numLabels]
+    # @param numLabels the highest label in this chunk (None: determine it
+    #                  while storing, which is cheap for sparse chunks)
+    # @param numForeground the number of non-zero labels, if the caller knows
+    #                      it already (saves a pass over the labels)
+    # @returns the highest label in this chunk
+    def store(self, chunkIndex, labels, numLabels=None, numForeground=None):
+        if numForeground is None:
+            numForeground = np.count_nonzero(labels)
+        occupancy = numForeground/float(max(labels.size, 1))
+        if occupancy < self._sparseOccupancy:
+            chunk = _SparseChunk(labels, numLabels)
+        else:
+            chunk = _DenseChunk(labels, numLabels)
+        self._chunks[chunkIndex] = chunk
+        self._forgetDecoded(chunkIndex)
+        return chunk.numLabels
+
+    ## read (a part of) the local labels of a chunk
+    # @param chunkIndex index of the chunk
+    # @param key slicing relative to the chunk (default: the whole chunk)
+    # @param dtype data type of the returned labels, None for the (possibly
+    #              narrower) type they are stored in
+    def read(self, chunkIndex, key=None, dtype=np.uint32):
+        labels = self._read(chunkIndex, key)
+        if dtype is not None and labels.dtype != dtype:
+            labels = labels.astype(dtype)
+        return labels
+
+    ## map (a part of) the local labels of a chunk to other labels
+    # @param chunkIndex index of the chunk
+    # @param key slicing relative to the chunk (None for the whole chunk)
+    # @param mapping array that maps each local label to its new label
+    # @param out array of the key's shape, will be filled with the mapped
+    #            labels
+    def mapInto(self, chunkIndex, key, mapping, out):
+        chunk = self._chunks[chunkIndex]
+        if isinstance(chunk, _SparseChunk):
+            chunk.mapInto(key, mapping, out)
+            return
+        # local labels are in [0, numLabels], clipping never happens but
+        # avoids an intermediate buffer in np.take
+        np.take(mapping, self._read(chunkIndex, key), out=out, mode='clip')
+
+    ## check whether a chunk is run-length encoded
+    def isSparse(self, chunkIndex):
+        return isinstance(self._chunks[chunkIndex], _SparseChunk)
+
+    ## the data type a chunk is stored in
+    def storageType(self, chunkIndex):
+        return self._chunks[chunkIndex].dtype
+
+    def __contains__(self, chunkIndex):
+        return chunkIndex in self._chunks
+
+    ## forget the labels of a chunk (no-op if the chunk is not stored)
+    def discard(self, chunkIndex):
+        self._chunks.pop(chunkIndex, None)
+        self._forgetDecoded(chunkIndex)
+
+    ## memory used for all stored labels, in bytes
+    @property
+    def data_bytes(self):
+        return sum(c.nbytes for c in list(self._chunks.values()))
+
+    ## memory used for the decompressed chunks, in bytes
+    @property
+    def decoded_bytes(self):
+        with self._lock:
+            return sum(d.nbytes for c, d in self._decoded.values())
+
+    # read (a part of) a chunk in its storage type, compressed chunks are
+    # decompressed through the cache
+    # the result must not be modified
+    def _read(self, chunkIndex, key):
+        chunk = self._chunks[chunkIndex]
+        if isinstance(chunk, _SparseChunk) or self._decodedChunks == 0:
+            return chunk.read(key)
+
+        with self._lock:
+            entry = self._decoded.pop(chunkIndex, None)
+            if entry is not None and entry[0] is chunk:
+                # most recently used
+                self._decoded[chunkIndex] = entry
+                data = entry[1]
+            else:
+                data = None
+        if data is None:
+            data = chunk.read()
+            with self._lock:
+                self._decoded[chunkIndex] = (chunk, data)
+                while len(self._decoded) > self._decodedChunks:
+                    self._decoded.popitem(last=False)
+        if key is not None:
+            data = data[key]
+        return data
+
+    def _forgetDecoded(self, chunkIndex):
+        with self._lock:
+            self._decoded.pop(chunkIndex, None)
@@ -4,6 +4,8 @@
 
 import numpy as np
 
+from _tools import uniquePairs
+
 
 ## join the labels of two adjacent chunks
 #
@@ -19,7 +21,8 @@ import numpy as np
 # @param UF_a hash table, mapping local labels to global labels (const)
 # @param UF_b hash table, mapping local labels to global labels (const)
 # @param GUF global UnionFind
-# @returns None
+# @returns array of shape (n, 2) with the unique pairs of adjacent local
+#          labels (label in A, label in B)
 def mergeLabels(hyperplane_a, hyperplane_b,
                 label_hyperplane_a, label_hyperplane_b,
                 mapping_a, mapping_b, GUF):
@@ -28,7 +31,9 @@ def mergeLabels(hyperplane_a, hyperplane_b,
     idx = np.logical_and(hyperplane_a == hyperplane_b,
                          label_hyperplane_a > 0)
 
-    # merge each pair of labels
-    for label_a, label_b in set(zip(label_hyperplane_a[idx],
-                                    label_hyperplane_b[idx])):
+    # merge each pair of labels once
+    labels_a, labels_b = uniquePairs(label_hyperplane_a[idx],
+                                     label_hyperplane_b[idx])
+    for label_a, label_b in zip(labels_a, labels_b):
         GUF.makeUnion(mapping_a[label_a], mapping_b[label_b])
+    return np.column_stack((labels_a, labels_b))
@@ -55,6 +55,9 @@ class UnionFindArray(object):
     def nextFreeLabel(self):
         raise NotImplementedError()
 
+    def nextFreeIndex(self):
+        return self._nextFree
+
     @locked
     def makeNewIndex(self):
         newLabel = self._nextFree
@@ -62,6 +65,14 @@ class UnionFindArray(object):
         self._map[newLabel] = newLabel
         return newLabel
 
+    ## forget indices that are not needed anymore
+    # No remaining index may point to one of the discarded indices, i.e. all
+    # indices of a connected component have to be discarded at once.
+    @locked
+    def discardIndices(self, indices):
+        for a in indices:
+            self._map.pop(a, None)
+
     @locked
     def findIndex(self, a):
         return self._findIndex(a)
@@ -5,20 +5,26 @@
 import numpy as np
 import vigra
 import logging
+import heapq
 
-from collections import defaultdict
+from collections import defaultdict, deque
 from functools import partial, wraps
+from Queue import Queue
 #from itertools import count as InfiniteLabelIterator
-from _tools import InfiniteLabelIterator
+from _tools import InfiniteLabelIterator, suggestChunkShape
+from _tools import snapToBlockShape, uniquePairs
+from _instrumentation import RuntimeStatistics, TraceRecorder, TimedLock
+from _labelStore import LabelStore
 
 from lazyflow.operator import Operator, InputSlot, OutputSlot
 from lazyflow.rtype import SubRegion
-from lazyflow.operators import OpCompressedCache, OpReorderAxes
+from lazyflow.operators import OpCompressedCache
 from lazyflow.request import Request, RequestPool
 from lazyflow.request import RequestLock as ReqLock
 # the lazyflow lock seems to have deadlock issues sometimes
 from threading import Lock as HardLock
 from threading import Condition
+from threading import local as ThreadLocal
 
 from _mockup import UnionFindArray
 #from lazycc import UnionFindArray
@@ -29,6 +35,13 @@ logger = logging.getLogger(__name__)
 
 _LABEL_TYPE = np.uint32
 
+# the axis order used internally, see OpLazyCC._toInternalView
+_AXES = 'txyzc'
+
+# upper bound for the size of a coalesced upstream request (see
+# OpLazyCC._labelCoalesced)
+_MAX_COALESCED_BYTES = 64 * 2**20
+
 
 def threadsafe(method):
     @wraps(method)
@@ -82,22 +95,51 @@ class _LabelManager(object):
             d[n] = labels
         return labels, others
 
+    # forget which processes finalized the labels of a chunk
+    @threadsafe
+    def releaseChunk(self, chunkIndex):
+        self._managedLabels.pop(chunkIndex, None)
+
 
 # locking decorator that locks per chunk
 def _chunksynchronized(method):
     @wraps(method)
     def synchronizedmethod(self, chunkIndex, *args, **kwargs):
-        with self._chunk_locks[chunkIndex]:
+        lock = TimedLock(self._chunk_locks[chunkIndex], self._stats,
+                         "chunkLockWait", tracer=self._tracer,
+                         chunk=chunkIndex)
+        with lock:
             return method(self, chunkIndex, *args, **kwargs)
     return synchronizedmethod
 
 
+# number of indices handed out by a union find structure, or 0 if it does
+# not tell (not all UnionFindArray implementations provide nextFreeIndex())
+def _unionFindSize(uf):
+    nextFreeIndex = getattr(uf, "nextFreeIndex", None)
+    if nextFreeIndex is None:
+        return 0
+    # index 0 is reserved for the background
+    return max(int(nextFreeIndex()) - 1, 0)
+
+
+# decorator that adds the time spent in a method to the runtime statistics
+def _timed(name):
+    def decorator(method):
+        @wraps(method)
+        def timedmethod(self, *args, **kwargs):
+            with self._stats.timer(name):
+                return method(self, *args, **kwargs)
+        return timedmethod
+    return decorator
+
+
 # general approach
 # ================
 #
 # There are 3 kinds of labels that we need to consider throughout the operator:
 #     * local labels: The output of the chunk wise labelVolume calls. These are
-#       stored in self._cache, a compressed VigraArray.
+#       stored per chunk in self._cache, a compressed LabelStore.
 #       aka 'local'
 #     * global indices: The mapping of local labels to unique global indices.
 #       The actual implemetation is hidden in self.localToGlobal().
@@ -110,55 +152,94 @@ def _chunksynchronized(method):
 #
 class OpLazyCC(Operator):
 
-    # input data (usually segmented), in 'txyzc' order
+    # input data (usually segmented), any subset of the axes 'txyzc' in any
+    # order
     Input = InputSlot()
 
-    # the spatial shape of one chunk, in 'xyz' order
-    ChunkShape = InputSlot()
+    # the spatial shape of one chunk, in 'xyz' order (optional, chosen
+    # automatically if not set)
+    # if the input has a block layout (meta.ideal_blockshape), the chunk shape
+    # is rounded to multiples of the upstream blocks
+    # the shape actually used is published in Output.meta.chunkShape (an
+    # automatic chunk shape is refined on the first request, see
+    # _refineChunkShape())
+    ChunkShape = InputSlot(optional=True)
 
-    # the labeled output, internally cached
+    # the labeled output, internally cached, in the same axis order as Input
     Output = OutputSlot()
 
-    ### INTERNALS -- DO NOT USE ###
-    _Input = OutputSlot()
-    _Output = OutputSlot()
-
     def __init__(self, *args, **kwargs):
         super(OpLazyCC, self).__init__(*args, **kwargs)
-        self._lock = HardLock()
-
-        # reordering operators - we want to handle txyzc inside this operator
-        self._opIn = OpReorderAxes(parent=self)
-        self._opIn.AxisOrder.setValue('txyzc')
-        self._opIn.Input.connect(self.Input)
-        self._Input.connect(self._opIn.Output)
-
-        self._opOut = OpReorderAxes(parent=self)
-        self._opOut.Input.connect(self._Output)
-        self.Output.connect(self._opOut.Output)
+        # runtime statistics and tracing, survive reconfiguration of the
+        # operator
+        self._stats = RuntimeStatistics()
+        self._tracer = TraceRecorder()
+        self._lock = TimedLock(HardLock(), self._stats, "lockWait",
+                               tracer=self._tracer)
+        # data layout of the last setupOutputs() (see _getLayout())
+        self._layout = None
+        # True if the automatic chunk shape was not refined yet
+        self._chunkShapePending = False
+        self._chunkShapeLock = ReqLock()
 
     def setupOutputs(self):
         self.Output.meta.assignFrom(self.Input.meta)
         self.Output.meta.dtype = _LABEL_TYPE
-        self._Output.meta.assignFrom(self._Input.meta)
-        self._Output.meta.dtype = _LABEL_TYPE
         assert self.Input.meta.dtype in [np.uint8, np.uint32, np.uint64],\
             "Cannot label data type {}".format(self.Input.meta.dtype)
 
-        self._setDefaultInternals()
-
-        # go back to original order
-        self._opOut.AxisOrder.setValue(self.Input.meta.getAxisKeys())
+        # we handle 'txyzc' internally, but work on views of the input and
+        # output arrays instead of reordering them
+        keys = self.Input.meta.getAxisKeys()
+        assert len(keys) == len(set(keys)) and set(keys) <= set(_AXES),\
+            "Cannot label data with axes {}".format(keys)
+        self._axisKeys = keys
+        shape = self.Input.meta.shape
+        self._shape = tuple(shape[keys.index(a)] if a in keys else 1
+                            for a in _AXES)
+
+        # keep the labeling state if neither the data layout nor the chunk
+        # grid changed, e.g. if the same pipeline was reconnected (changes of
+        # the data itself are handled in propagateDirty)
+        layout = self._getLayout()
+        if layout == self._layout and not self.ChunkShape.ready():
+            # keep the automatic chunk shape, even if it was refined already
+            chunkShape = self._spatialChunkShape
+        else:
+            chunkShape = self._getChunkShape()
+        if layout != self._layout or chunkShape != self._spatialChunkShape:
+            self._layout = layout
+            self._spatialChunkShape = chunkShape
+            self._chunkShapePending = not self.ChunkShape.ready()
+            self._setDefaultInternals()
+        else:
+            logger.debug("Layout unchanged, keeping the labeling state")
+        self.Output.meta.chunkShape = self._spatialChunkShape
 
     def execute(self, slot, subindex, roi, result):
-        if slot is self._Output:
+        if slot is self.Output:
+            if self._chunkShapePending:
+                self._refineChunkShape()
+            roi = self._toInternalRoi(roi)
+            result = self._toInternalView(result)
             othersToWaitFor = set()
             chunks = self._roiToChunkIndex(roi)
+            self._labelCoalesced(chunks)
+            roiChunks = frozenset(chunks)
             for chunk in chunks:
-                othersToWaitFor |= self.growRegion(chunk)
-
-            self._manager.waitFor(othersToWaitFor)
-            self._mapArray(roi, result)
+                othersToWaitFor |= self.growRegion(chunk, roiChunks)
+
+            with self._tracer.span("waitFor", tickets=sorted(othersToWaitFor)):
+                self._manager.waitFor(othersToWaitFor)
+
+            if self._coversSlices(roi):
+                # all chunks of the requested (t, c) slices are merged now
+                for t in range(roi.start[0], roi.stop[0]):
+                    for c in range(roi.start[4], roi.stop[4]):
+                        self._finalizeSlice(t, c)
+                self._mapArray(roi, result, parallel=True)
+            else:
+                self._mapArray(roi, result)
         else:
             raise ValueError("Request to invalid slot {}".format(str(slot)))
 
@@ -170,23 +251,203 @@ class OpLazyCC(Operator):
         self._setDefaultInternals()
         self.Output.setDirty(slice(None))
 
+    # get a dict of runtime statistics, accumulated since the last call to
+    # resetStatistics(). The keys are
+    #     chunksLabeled, facesMerged, makeUnionCalls: counters
+    #     emptyChunks: number of labeled chunks without foreground
+    #     unionFindSize: number of global indices handed out (0 if the
+    #         union find structure cannot report it)
+    #     unionFindReleased: number of global indices freed after their
+    #         (t, c) slice was finalized completely
+    #     timeLabel, timeMerge, timeFinalize: time spent in the respective
+    #         method, in seconds
+    #     timeMapChunk: time spent mapping chunks to final labels, including
+    #         writing them to the output, in seconds
+    #     lockWait, chunkLockWait: time spent waiting for self._lock and the
+    #         chunk locks, in seconds (summed over all threads)
+    #     upstreamRequests, upstreamBytes: number of requests to the input
+    #         and bytes requested
+    #     timeUpstream: time spent waiting for the input, in seconds
+    #     cacheBytesRead: bytes read from the local label cache
+    def getStatistics(self):
+        stats = dict.fromkeys(["chunksLabeled", "emptyChunks", "facesMerged",
+                               "makeUnionCalls", "upstreamRequests",
+                               "upstreamBytes", "cacheBytesRead",
+                               "unionFindReleased"], 0)
+        stats.update(dict.fromkeys(["timeLabel", "timeMerge", "timeMapChunk",
+                                    "timeFinalize", "timeUpstream",
+                                    "lockWait", "chunkLockWait"], 0.0))
+        stats.update(self._stats.snapshot())
+        stats["unionFindSize"] = _unionFindSize(getattr(self, "_uf", None))
+        return stats
+
+    # set all runtime statistics to 0, e.g. between requests
+    def resetStatistics(self):
+        self._stats.reset()
+
+    # start recording a timeline of region growing, i.e. spans for
+    # growRegion, _label, _merge, _mapChunk and lock waits per thread
+    # (previous recordings are discarded)
+    def startTracing(self):
+        self._tracer.start()
+
+    # stop recording, the timeline is kept until the next startTracing()
+    def stopTracing(self):
+        self._tracer.stop()
+
+    # write the recorded timeline in Chrome's trace event JSON format, open
+    # it with chrome://tracing or any compatible viewer
+    def writeTrace(self, filename):
+        self._tracer.write(filename)
+
+    # iterate over the final labels of a region, chunk by chunk
+    # The chunks are finalized in the background and yielded in the order
+    # in which they are completed. At most 'window' chunks are finalized or
+    # waiting to be consumed at any time, so memory usage depends on the
+    # pace of the consumer, not on the size of the region.
+    # @param roi region of interest (SubRegion in the input's axis order)
+    # @param window maximum number of chunks in flight
+    # @returns generator of tuples (roi, labels), the roi of each piece is in
+    #          the input's axis order and labels has the roi's shape
+    def iterLabels(self, roi, window=8):
+        assert window > 0, "Need at least one chunk in flight"
+        roi = self._toInternalRoi(roi)
+        chunks = self._roiToChunkIndex(roi)
+        roiChunks = frozenset(chunks)
+        todo = list(reversed(chunks))
+        finished = Queue()
+
+        def submitNext():
+            chunkIndex = todo.pop()
+            req = Request(partial(self._finalizeChunk, chunkIndex, roi,
+                                  roiChunks))
+            # the request itself is queued, wait() returns the result or
+            # raises the exception
+            req.notify_finished(lambda result: finished.put(req))
+            req.notify_failed(lambda exc, exc_info: finished.put(req))
+            req.submit()
+
+        inFlight = 0
+        while todo or inFlight > 0:
+            while todo and inFlight < window:
+                submitNext()
+                inFlight += 1
+            req = finished.get()
+            inFlight -= 1
+            yield req.wait()
+
+    # label a time series frame by frame
+    # Up to 'window' frames are labeled concurrently, the frames are yielded
+    # in time order. After a frame was handed out, its local labels, union
+    # find indices, merge results and locks are released, so memory usage
+    # depends on the window size, not on the number of frames. A released
+    # frame is labeled again if it is requested later on.
+    # Other requests must not access a frame while it is labeled here.
+    # @param window maximum number of frames in flight
+    # @returns generator of tuples (t, labels), labels contains all channels
+    #          of frame t in the input's axis order (a time axis of the input
+    #          is kept, with extent 1)
+    def iterFrames(self, window=2):
+        assert window > 0, "Need at least one frame in flight"
+        todo = list(reversed(range(self._shape[0])))
+        inFlight = deque()
+
+        while todo or inFlight:
+            while todo and len(inFlight) < window:
+                t = todo.pop()
+                req = Request(partial(self._labelFrame, t))
+                req.submit()
+                inFlight.append((t, req))
+            t, req = inFlight.popleft()
+            labels = req.wait()
+            self._releaseFrame(t)
+            yield t, labels
+
+    # compute the final labels of a whole frame (helper for iterFrames)
+    def _labelFrame(self, t):
+        start = (t, 0, 0, 0, 0)
+        stop = (t+1,) + self._shape[1:]
+        roi = self._toNativeRoi(SubRegion(self.Output, start=start,
+                                          stop=stop))
+        return self.Output(roi.start, roi.stop).wait()
+
+    # reset all chunks of a frame to the unlabeled state and free their
+    # memory (see iterFrames)
+    def _releaseFrame(self, t):
+        chunks = [(t,) + idx
+                  for idx in np.ndindex(*self._chunkArrayShape[1:])]
+
+        # background labeling of a neighbour might still be running
+        with self._lock:
+            positions = set(chunk[:4] for chunk in chunks)
+            reqs = [self._labelRequests.pop(pos)
+                    for pos in positions if pos in self._labelRequests]
+        for req in reqs:
+            req.wait()
+
+        with self._lock:
+            for c in range(self._shape[4]):
+                # union find indices of unfinished slices
+                self._releaseSlice(t, c)
+                self._releasedSlices.discard((t, c))
+                self._labelIterators.pop((t, c), None)
+            for chunk in chunks:
+                self._cache.discard(chunk)
+                self._finalLabels.pop(chunk, None)
+                self._mergeMap.pop(chunk, None)
+                self._chunk_locks.pop(chunk, None)
+                self._manager.releaseChunk(chunk)
+            self._numIndices[t, ...] = -1
+            self._isEmpty[t, ...] = False
+            self._isFinal[t, ...] = False
+
+    # finalize a single chunk and map the part of it that lies inside roi
+    # (helper for iterLabels)
+    # @returns tuple (roi, labels) in the input's axis order
+    def _finalizeChunk(self, chunkIndex, roi, roiChunks):
+        othersToWaitFor = self.growRegion(chunkIndex, roiChunks)
+        with self._tracer.span("waitFor", tickets=sorted(othersToWaitFor)):
+            self._manager.waitFor(othersToWaitFor)
+        chunkRoi = self._chunkIndexToRoi(chunkIndex)
+        chunkRoi.start = np.maximum(chunkRoi.start, roi.start)
+        chunkRoi.stop = np.minimum(chunkRoi.stop, roi.stop)
+        nativeRoi = self._toNativeRoi(chunkRoi)
+        labels = np.zeros(tuple(np.subtract(nativeRoi.stop, nativeRoi.start)),
+                          dtype=_LABEL_TYPE)
+        self._mapArray(chunkRoi, self._toInternalView(labels))
+        return nativeRoi, labels
+
     # grow the requested region such that all labels inside that region are
     # final
     # @param chunkIndex the index of the chunk to finalize
-    def growRegion(self, chunkIndex):
+    # @param roiChunks the chunks of the requested region, these are visited
+    #                  first
+    def growRegion(self, chunkIndex, roiChunks=frozenset()):
         ticket = self._manager.register()
+        with self._tracer.span("growRegion", chunk=chunkIndex, ticket=ticket):
+            othersToWaitFor = self._growRegion(chunkIndex, ticket, roiChunks)
+        self._manager.unregister(ticket)
+        return othersToWaitFor
+
+    # the actual region growing, see growRegion()
+    def _growRegion(self, chunkIndex, ticket, roiChunks=frozenset()):
         othersToWaitFor = set()
 
-        # we want to finalize every label in our first chunk
-        localLabels = np.arange(1, self._numIndices[chunkIndex]+1)
-        localLabels = localLabels.astype(_LABEL_TYPE)
-        chunksToProcess = {chunkIndex: localLabels}
+        # we want to finalize every label in our first chunk, chunks that
+        # share objects are visited in the order of _growPriority()
+        chunksToProcess = [self._growPriority(chunkIndex, chunkIndex,
+                                              roiChunks)]
+        # all labels of a chunk are finalized on the first visit
+        queued = set([chunkIndex])
 
         while chunksToProcess:
-            currentChunk, localLabels = chunksToProcess.popitem()
+            currentChunk = heapq.heappop(chunksToProcess)[-1]
 
             # label this chunk
-            self._label(chunkIndex)
+            self._waitForLabel(currentChunk, ticket)
+            if self._isEmpty[currentChunk]:
+                # no objects that could extend into the neighbours
+                continue
 
             # get the labels in use by this chunk
             localLabels = np.arange(1, self._numIndices[currentChunk]+1)
@@ -201,60 +462,198 @@ class OpLazyCC(Operator):
             # now we have got a list of local labels for this chunk, which no
             # other process is going to finalize
 
-            # start merging adjacent regions
+            # start merging adjacent regions, the neighbours are labeled in
+            # the background while we merge the faces to neighbours that are
+            # labeled already
             otherChunks = self._generateNeighbours(currentChunk)
             for other in otherChunks:
-                self._label(other)
+                self._prefetchLabel(other, ticket)
+            otherChunks.sort(key=lambda c: self._numIndices[c] < 0)
+            for other in otherChunks:
+                self._waitForLabel(other, ticket)
                 a, b = self._orderPair(currentChunk, other)
-                me = 0 if a == chunkIndex else 1
-                res = self._merge(a, b)
-                myLabels, otherLabels = res[me], res[1-me]
+                me = 0 if a == currentChunk else 1
+                with self._tracer.span("_merge", chunk=a, other=b,
+                                       ticket=ticket):
+                    res = self._merge(a, b)
+                myLabels = res[me]
+
+                if other in queued:
+                    # every label of 'other' is going to be finalized anyway
+                    continue
 
                 # determine which objects from this chunk continue in the
-                # neighbouring chunk
-                extendingLabels = [b for a, b in zip(myLabels, otherLabels)
-                                   if a in actualLabels]
-                extendingLabels = np.unique(extendingLabels
-                                            ).astype(_LABEL_TYPE)
-
-                # add the neighbour to our processing queue only if it actually
-                # shares objects
-                if extendingLabels.size > 0:
-                    if other in chunksToProcess:
-                        extendingLabels = np.union1d(chunksToProcess[other],
-                                                     extendingLabels)
-                    chunksToProcess[other] = extendingLabels
+                # neighbouring chunk (the pairs are unique, the check is
+                # vectorized)
+                extending = np.in1d(myLabels, actualLabels)
+                if not np.any(extending):
+                    # the neighbour does not share objects
+                    continue
+                heapq.heappush(chunksToProcess,
+                               self._growPriority(other, chunkIndex,
+                                                  roiChunks))
+                queued.add(other)
+
+                # the neighbours of a chunk in the frontier will be needed for
+                # merging, start labeling them now
+                for n in self._generateNeighbours(other):
+                    self._prefetchLabel(n, ticket)
 
-        self._manager.unregister(ticket)
         return othersToWaitFor
 
-    # label a chunk and store information
+    # priority of a chunk in region growing, smaller priorities are visited
+    # first:
+    #     1. chunks inside the requested region (their labels are needed for
+    #        the result anyway)
+    #     2. chunks that are labeled already (no upstream request)
+    #     3. chunks close to the start chunk (cache locality)
+    # @returns tuple (priority..., chunkIndex), to be used in a heap
+    def _growPriority(self, chunkIndex, origin, roiChunks):
+        distance = sum(abs(a - b) for a, b in zip(chunkIndex, origin))
+        return (chunkIndex not in roiChunks,
+                bool(self._numIndices[chunkIndex] < 0),
+                distance, chunkIndex)
+
+    # start labeling a chunk in the background, does not block
+    # use _waitForLabel() to make sure that the chunk is labeled
+    # (the requests are stored per spatial position, because _label() labels
+    # all channels at once)
+    def _prefetchLabel(self, chunkIndex, ticket=None):
+        with self._lock:
+            if self._numIndices[chunkIndex] >= 0:
+                return
+            if chunkIndex[:4] in self._labelRequests:
+                return
+            req = Request(partial(self._tracedLabel, chunkIndex, ticket))
+            self._labelRequests[chunkIndex[:4]] = req
+        req.submit()
+
+    # block until a chunk is labeled, either by a request that was started
+    # with _prefetchLabel() or by labeling it now
+    def _waitForLabel(self, chunkIndex, ticket=None):
+        with self._lock:
+            req = self._labelRequests.get(chunkIndex[:4], None)
+        if req is None:
+            self._tracedLabel(chunkIndex, ticket)
+            return
+        req.wait()
+        with self._lock:
+            self._labelRequests.pop(chunkIndex[:4], None)
+
+    def _tracedLabel(self, chunkIndex, ticket=None):
+        with self._tracer.span("_label", chunk=chunkIndex, ticket=ticket):
+            self._label(chunkIndex)
+
+    # label all chunks of a list that are not labeled yet
+    # Runs of adjacent chunks (along the spatial axis where the list extends
+    # the most) are fetched from upstream with a single request, which is
+    # then split into chunks locally.
+    def _labelCoalesced(self, chunks):
+        # all channels of a position are labeled together (see _label)
+        chunks = sorted(set(c[:4] + (0,) for c in chunks
+                            if self._numIndices[c] < 0))
+        if len(chunks) < 2:
+            return
+        extent = np.ptp(np.asarray(chunks), axis=0)
+        axis = 1 + np.argmax(extent[1:4])
+        chunks = sorted(chunks,
+                        key=lambda c: c[:axis] + c[axis+1:] + (c[axis],))
+
+        itemsize = np.dtype(self.Input.meta.dtype).itemsize
+        maxChunks = max(1, _MAX_COALESCED_BYTES //
+                        (itemsize * np.prod(self._chunkShape) *
+                         self._shape[4]))
+        runs = [[chunks[0]]]
+        for chunk in chunks[1:]:
+            last = runs[-1][-1]
+            if len(runs[-1]) < maxChunks and \
+                    chunk[:axis] == last[:axis] and \
+                    chunk[axis+1:] == last[axis+1:] and \
+                    chunk[axis] == last[axis] + 1:
+                runs[-1].append(chunk)
+            else:
+                runs.append([chunk])
+
+        for run in runs:
+            if len(run) == 1:
+                self._label(run[0])
+                continue
+            start = self._chunkIndexToRoi(run[0]).start
+            stop = tuple(self._chunkIndexToRoi(run[-1]).stop[:4]) + \
+                (self._shape[4],)
+            roi = SubRegion(self.Input, start=tuple(start), stop=stop)
+            data = self._getInput(roi)
+            for chunk in run:
+                chunkRoi = self._chunkIndexToRoi(chunk)
+                # spatial slicing, all channels
+                start = np.asarray(chunkRoi.start[:4]) - roi.start[:4]
+                stop = np.asarray(chunkRoi.stop[:4]) - roi.start[:4]
+                s = tuple(slice(a, b) for a, b in zip(start, stop))
+                self._label(chunk, inputChunk=data[s])
+
+    # label a chunk and all other channels at the same spatial position
+    # The channels are requested from upstream together, such that upstream
+    # operators don't repeat shared work for each channel.
+    # @param inputChunk the input data of all channels of this chunk, if it
+    #                   has already been requested
+    def _label(self, chunkIndex, inputChunk=None):
+        chunks = [chunkIndex[:4] + (c,) for c in range(self._shape[4])]
+        chunks = [chunk for chunk in chunks if self._numIndices[chunk] < 0]
+        if not chunks:
+            return
+
+        # get the raw data of the channels that are not labeled yet
+        first = 0
+        if inputChunk is None:
+            first = chunks[0][4]
+            roi = self._chunkIndexToRoi(chunkIndex)
+            start = tuple(roi.start[:4]) + (first,)
+            stop = tuple(roi.stop[:4]) + (chunks[-1][4] + 1,)
+            inputChunk = self._getInput(SubRegion(self.Input, start=start,
+                                                  stop=stop))
+        for chunk in chunks:
+            c = chunk[4] - first
+            self._labelChannel(chunk, inputChunk[..., c:c+1])
+
+    # label a single channel of a chunk and store information
+    # @param inputChunk the input data of this chunk
     @_chunksynchronized
-    def _label(self, chunkIndex):
+    @_timed("timeLabel")
+    def _labelChannel(self, chunkIndex, inputChunk):
         if self._numIndices[chunkIndex] >= 0:
             # this chunk is already labeled
             return
 
         # get the raw data
-        roi = self._chunkIndexToRoi(chunkIndex)
-        inputChunk = self._Input.get(roi).wait()
-        inputChunk = vigra.taggedView(inputChunk, axistags='txyzc')
-        inputChunk = inputChunk.withAxes(*'xyz')
-
-        # label the raw data
-        labeled = vigra.analysis.labelVolumeWithBackground(inputChunk)
-        labeled = vigra.taggedView(labeled, axistags='xyz').withAxes(*'txyzc')
+        inputChunk = vigra.taggedView(inputChunk[0, ..., 0], axistags='xyz')
+
+        # all background, nothing to label or store
+        # (lazyflow has no metadata for empty regions, so we have to look)
+        # the count decides how the labels are stored, too
+        numForeground = np.count_nonzero(inputChunk)
+        if numForeground == 0:
+            with self._lock:
+                self._isEmpty[chunkIndex] = True
+                # publish last, see below
+                self._numIndices[chunkIndex] = 0
+            self._stats.count("chunksLabeled")
+            self._stats.count("emptyChunks")
+            return
+
+        # label the raw data into this thread's buffer
+        labeled = self._labelBuffer(inputChunk.shape)
+        vigra.analysis.labelVolumeWithBackground(inputChunk, out=labeled)
         del inputChunk
-        #TODO this could be more efficiently combined with merging
 
-        # store the labeled data in cache
-        self._cache[roi.toSlice()] = labeled
+        # store the labeled data in cache, in the smallest possible dtype
+        # (the store copies the labels and finds the highest one, vigra does
+        # not report the number of labels)
+        numLabels = self._cache.store(chunkIndex, labeled.view(np.ndarray),
+                                      numForeground=numForeground)
 
         # update the labeling information
-        numLabels = labeled.max()  # we ignore 0 here
-        self._numIndices[chunkIndex] = numLabels
-        if numLabels > 0:
-            with self._lock:
+        with self._lock:
+            if numLabels > 0:
                 # get 1 label that determines the offset
                 offset = self._uf.makeNewIndex()
                 # the offset is such that label 1 in the local chunk maps to
@@ -264,22 +663,112 @@ class OpLazyCC(Operator):
                 # get n-1 more labels
                 for i in range(numLabels-1):
                     self._uf.makeNewIndex()
+            # other threads check _numIndices without the chunk lock, so it
+            # is set only after the offset and the indices exist
+            self._numIndices[chunkIndex] = numLabels
+        self._stats.count("chunksLabeled")
+
+    # get a reusable output array for labeling a chunk of the given spatial
+    # shape
+    # Each thread owns a buffer of the full chunk shape, smaller chunks at the
+    # border of the volume get a view of it. The contents are only valid
+    # until the thread labels the next chunk.
+    def _labelBuffer(self, shape):
+        buf = getattr(self._labelBuffers, "labels", None)
+        if buf is None:
+            buf = np.empty(tuple(self._chunkShape[1:4]), dtype=_LABEL_TYPE)
+            buf = vigra.taggedView(buf, axistags='xyz')
+            self._labelBuffers.labels = buf
+        return buf[tuple(slice(0, n) for n in shape)]
 
     # merge the labels of two adjacent chunks
     # the chunks have to be ordered lexicographically, e.g. by self._orderPair
+    # The input data at the face is requested for all channels at once, the
+    # same face is merged for the other channels as well unless another
+    # thread is working on them.
+    # @returns pair of arrays with corresponding local labels of chunkA and
+    #          chunkB, each pair of labels appears only once
     @_chunksynchronized
+    @_timed("timeMerge")
     def _merge(self, chunkA, chunkB):
         if chunkB in self._mergeMap[chunkA]:
+            return self._mergeMap[chunkA][chunkB]
+
+        # the face data is requested on demand, at most once
+        faces = []
+
+        def getFaces(c):
+            if not faces:
+                faces.append(self._getFaces(chunkA, chunkB))
+            return faces[0][0][..., c], faces[0][1][..., c]
+
+        pairs = self._mergeFace(chunkA, chunkB, getFaces)
+        self._mergeMap[chunkA][chunkB] = pairs
+        if not faces:
+            return pairs
+
+        for c in range(self._shape[4]):
+            otherA = chunkA[:4] + (c,)
+            otherB = chunkB[:4] + (c,)
+            # both chunks have to be labeled completely, _numIndices is set
+            # only after the offsets and union find indices exist (see
+            # _labelChannel)
+            if c == chunkA[4] or self._numIndices[otherA] < 0 or \
+                    self._numIndices[otherB] < 0:
+                continue
+            # waiting for the lock could deadlock, try the next channel
+            lock = self._chunk_locks[otherA]
+            if not lock.acquire(False):
+                continue
+            try:
+                if otherB not in self._mergeMap[otherA]:
+                    self._mergeMap[otherA][otherB] = \
+                        self._mergeFace(otherA, otherB, getFaces)
+            finally:
+                lock.release()
+        return pairs
+
+    # get the input data at the face of two adjacent chunks
+    # @returns tuple (a, b) of arrays with axes 'xyzc' for the hyperplane of
+    #          each chunk, with all channels
+    def _getFaces(self, chunkA, chunkB):
+        hyperplane_roi_a, hyperplane_roi_b = \
+            self._chunkIndexToHyperplane(chunkA, chunkB)
+        # both hyperplanes are adjacent, so we get them with one request
+        start = np.minimum(hyperplane_roi_a.start, hyperplane_roi_b.start)
+        stop = np.maximum(hyperplane_roi_a.stop, hyperplane_roi_b.stop)
+        start[4], stop[4] = 0, self._shape[4]
+        hyperplanes = self._getInput(SubRegion(self.Input, start=tuple(start),
+                                               stop=tuple(stop)))[0]
+        axis = np.flatnonzero(np.asarray(hyperplane_roi_a.start) !=
+                              hyperplane_roi_b.start)[0]
+        s = [slice(None)]*hyperplanes.ndim
+        # the first axis (t) was dropped
+        axis -= 1
+        s[axis] = slice(0, 1)
+        hyperplane_a = hyperplanes[tuple(s)]
+        s[axis] = slice(1, 2)
+        hyperplane_b = hyperplanes[tuple(s)]
+        return hyperplane_a, hyperplane_b
+
+    # the actual merging, see _merge()
+    # @param getFaces function that returns the input data at the face for a
+    #                 channel, see _getFaces()
+    def _mergeFace(self, chunkA, chunkB, getFaces):
+        if self._isEmpty[chunkA] or self._isEmpty[chunkB]:
+            # no objects can touch the face
             return (np.zeros((0,), dtype=_LABEL_TYPE),)*2
-        self._mergeMap[chunkA].append(chunkB)
 
         hyperplane_roi_a, hyperplane_roi_b = \
             self._chunkIndexToHyperplane(chunkA, chunkB)
-        hyperplane_index_a = hyperplane_roi_a.toSlice()
-        hyperplane_index_b = hyperplane_roi_b.toSlice()
+        hyperplane_index_a = self._chunkSlicing(chunkA, hyperplane_roi_a)
+        hyperplane_index_b = self._chunkSlicing(chunkB, hyperplane_roi_b)
 
-        label_hyperplane_a = self._cache[hyperplane_index_a]
-        label_hyperplane_b = self._cache[hyperplane_index_b]
+        label_hyperplane_a = self._cache.read(chunkA, hyperplane_index_a)
+        label_hyperplane_b = self._cache.read(chunkB, hyperplane_index_b)
+        self._stats.count("cacheBytesRead", label_hyperplane_a.nbytes +
+                          label_hyperplane_b.nbytes)
+        self._stats.count("facesMerged")
 
         # see if we have border labels at all
         adjacent_bool_inds = np.logical_and(label_hyperplane_a > 0,
@@ -288,54 +777,164 @@ class OpLazyCC(Operator):
             return (np.zeros((0,), dtype=_LABEL_TYPE),)*2
 
         # check if the labels do actually belong to the same component
-        hyperplane_a = self._Input[hyperplane_index_a].wait()
-        hyperplane_b = self._Input[hyperplane_index_b].wait()
+        hyperplane_a, hyperplane_b = getFaces(chunkA[4])
         adjacent_bool_inds = np.logical_and(adjacent_bool_inds,
                                             hyperplane_a == hyperplane_b)
+        correspondingLabelsA, correspondingLabelsB = uniquePairs(
+            label_hyperplane_a[adjacent_bool_inds],
+            label_hyperplane_b[adjacent_bool_inds])
 
         # union find manipulations are critical
         with self._lock:
             map_a = self.localToGlobal(chunkA, mapping=True)
             map_b = self.localToGlobal(chunkB, mapping=True)
-            labels_a = map_a[label_hyperplane_a[adjacent_bool_inds]]
-            labels_b = map_b[label_hyperplane_b[adjacent_bool_inds]]
+            labels_a = map_a[correspondingLabelsA]
+            labels_b = map_b[correspondingLabelsB]
             for a, b in zip(labels_a, labels_b):
                 self._uf.makeUnion(a, b)
-        correspondingLabelsA = label_hyperplane_a[adjacent_bool_inds]
-        correspondingLabelsB = label_hyperplane_b[adjacent_bool_inds]
+        self._stats.count("makeUnionCalls", len(labels_a))
         return correspondingLabelsA, correspondingLabelsB
 
     # get a rectangular region with final global labels
+    # The local labels of each chunk are read once and mapped to final labels
+    # directly into the corresponding part of result.
     # @param roi region of interest
     # @param result array of shape roi.stop - roi.start, will be filled
-    def _mapArray(self, roi, result, global_labels=True):
+    # @param parallel map the chunks in parallel (use when the chunks are
+    #                 finalized already, see _finalizeSlice())
+    def _mapArray(self, roi, result, global_labels=True, parallel=False):
         # TODO perhaps with pixeloperator?
         assert np.all(roi.stop - roi.start == result.shape)
         indices = self._roiToChunkIndex(roi)
+        if not parallel or len(indices) < 2:
+            for idx in indices:
+                self._mapArrayChunk(idx, roi, result)
+            return
+
+        pool = RequestPool()
         for idx in indices:
-            newroi = self._chunkIndexToRoi(idx)
-            newroi.stop = np.minimum(newroi.stop, roi.stop)
-            newroi.start = np.maximum(newroi.start, roi.start)
-            self._mapChunk(idx)
-            chunk = self._cache[newroi.toSlice()]
-            newroi.start -= roi.start
-            newroi.stop -= roi.start
-            s = newroi.toSlice()
-            result[s] = chunk
+            pool.add(Request(partial(self._mapArrayChunk, idx, roi, result)))
+        pool.wait()
+
+    # map the part of a chunk that lies inside roi (helper for _mapArray)
+    def _mapArrayChunk(self, idx, roi, result):
+        newroi = self._chunkIndexToRoi(idx)
+        newroi.stop = np.minimum(newroi.stop, roi.stop)
+        newroi.start = np.maximum(newroi.start, roi.start)
+        key = self._chunkSlicing(idx, newroi)
+        newroi.start -= roi.start
+        newroi.stop -= roi.start
+        out = result[newroi.toSlice()][0, ..., 0]
+        if self._isEmpty[idx]:
+            out[:] = 0
+            return
+        # the timer covers writing the final labels, too, this is where
+        # most of the mapping work happens
+        with self._stats.timer("timeMapChunk"):
+            with self._tracer.span("_mapChunk", chunk=idx):
+                finalLabels = self._mapChunk(idx)
+            # labels are read in their storage type, sparse chunks only
+            # touch their foreground
+            self._cache.mapInto(idx, key, finalLabels, out)
+        itemsize = np.dtype(self._cache.storageType(idx)).itemsize
+        self._stats.count("cacheBytesRead", out.size*itemsize)
+
+    # check whether a roi covers the complete spatial extent of the volume
+    def _coversSlices(self, roi):
+        return np.all(np.asarray(roi.start[1:4]) == 0) and \
+            np.all(np.asarray(roi.stop[1:4]) == self._shape[1:4])
+
+    # assign final labels to all objects of a (t, c) slice at once
+    # All chunks of the slice must be labeled and merged. The final labels
+    # are computed in one vectorized pass over the roots of all global
+    # indices, afterwards the chunks can be mapped without touching the
+    # label iterator. Nothing is done if final labels have already been
+    # handed out in this slice.
+    # @returns True if the slice was finalized by this call
+    @threadsafe
+    @_timed("timeFinalize")
+    def _finalizeSlice(self, t, c):
+        if self._globalToFinal.get((t, c)) or \
+                np.any(self._isFinal[t, ..., c]):
+            return False
+        chunks = [(t,) + xyz + (c,)
+                  for xyz in np.ndindex(*self._chunkArrayShape[1:4])]
+        counts = [int(self._numIndices[chunk]) for chunk in chunks]
+        assert min(counts) >= 0, "Not all chunks of the slice are labeled"
+
+        indices = [np.arange(1, n+1, dtype=_LABEL_TYPE) +
+                   self._globalLabelOffset[chunk]
+                   for chunk, n in zip(chunks, counts)]
+        indices = np.concatenate([np.zeros((0,), dtype=_LABEL_TYPE)] +
+                                 indices)
+        roots = np.asarray(map(self._uf.findIndex, indices),
+                           dtype=_LABEL_TYPE)
+        # final labels are contiguous in the order of the roots
+        roots, final = np.unique(roots, return_inverse=True)
+        final = (final + 1).astype(_LABEL_TYPE)
+        self._globalToFinal[(t, c)].update(
+            zip(roots.tolist(), range(1, len(roots)+1)))
+        self._labelIterators[(t, c)].n = len(roots) + 1
+
+        pos = 0
+        for chunk, n in zip(chunks, counts):
+            if n > 0:
+                labels = np.zeros((n+1,), dtype=_LABEL_TYPE)
+                labels[1:] = final[pos:pos+n]
+                self._finalLabels[chunk] = labels
+                self._isFinal[chunk] = True
+            pos += n
+        self._releaseSlice(t, c)
+        return True
+
+    # free the union find indices and the root -> final label mapping of a
+    # (t, c) slice in which every chunk is final
+    # The final chunks only need their local -> final mapping from now on,
+    # and all faces they touch are merged already. Objects never span
+    # several slices, so no other index can point into the slice.
+    # The caller has to hold self._lock.
+    def _releaseSlice(self, t, c):
+        if (t, c) in self._releasedSlices:
+            return
+        self._globalToFinal.pop((t, c), None)
+        self._releasedSlices.add((t, c))
 
+        # vigra's UnionFindArray cannot free single indices
+        discard = getattr(self._uf, "discardIndices", None)
+        if discard is None:
+            return
+        chunks = [(t,) + xyz + (c,)
+                  for xyz in np.ndindex(*self._chunkArrayShape[1:4])]
+        indices = [np.arange(1, n+1, dtype=np.int64) + offset
+                   for n, offset in ((int(self._numIndices[chunk]),
+                                      int(self._globalLabelOffset[chunk]))
+                                     for chunk in chunks)
+                   if n > 0]
+        for i in indices:
+            discard(i.tolist())
+        self._stats.count("unionFindReleased", sum(len(i) for i in indices))
+
+    # get the mapping of local labels to final labels for a chunk
+    # the local labels in self._cache are never overwritten
     @_chunksynchronized
     def _mapChunk(self, chunkIndex):
         if self._isFinal[chunkIndex]:
-            return
+            return self._finalLabels[chunkIndex]
 
-        newroi = self._chunkIndexToRoi(chunkIndex)
-        s = newroi.toSlice()
-        chunk = self._cache[s]
-        labels = self.localToGlobal(chunkIndex, mapping=True)
-        self.globalToFinal(chunkIndex[0], chunkIndex[4], labels)
-        self._cache[s] = labels[chunk]
+        t, c = chunkIndex[0], chunkIndex[4]
+        # _finalizeSlice() finalizes chunks while holding self._lock only,
+        # and may release the slice's union find indices afterwards
+        with self._lock:
+            if self._isFinal[chunkIndex]:
+                return self._finalLabels[chunkIndex]
+            labels = self.localToGlobal(chunkIndex, mapping=True)
+            self._assignFinalLabels(t, c, labels)
+            self._finalLabels[chunkIndex] = labels
 
-        self._isFinal[chunkIndex] = True
+            self._isFinal[chunkIndex] = True
+            if np.all(self._isFinal[t, ..., c] | self._isEmpty[t, ..., c]):
+                self._releaseSlice(t, c)
+        return labels
 
     # returns an array of global labels in use by this chunk if 'mapping' is
     # False, a mapping of local labels to global labels otherwise
@@ -365,9 +964,18 @@ class OpLazyCC(Operator):
     # UnionFind.makeUnion any more!
     @threadsafe
     def globalToFinal(self, t, c, labels):
+        self._assignFinalLabels(t, c, labels)
+
+    # the actual mapping, see globalToFinal()
+    # The caller has to hold self._lock.
+    def _assignFinalLabels(self, t, c, labels):
         d = self._globalToFinal[(t, c)]
         labeler = self._labelIterators[(t, c)]
-        for k in np.unique(labels):
+        # look up the final label of each distinct index first, replacing
+        # in place could hit labels that were written in an earlier step
+        indices, inverse = np.unique(labels, return_inverse=True)
+        final = np.zeros(indices.shape, dtype=labels.dtype)
+        for i, k in enumerate(indices):
             l = self._uf.findIndex(k)
             if l == 0:
                 continue
@@ -376,12 +984,123 @@ class OpLazyCC(Operator):
             if l not in d:
                 nextLabel = labeler.next()
                 d[l] = nextLabel
-            labels[labels == l] = d[l]
+            final[i] = d[l]
+        labels[:] = final[inverse]
 
     ##########################################################################
     ##################### HELPER METHODS #####################################
     ##########################################################################
 
+    # everything the labeling state depends on, apart from the chunk shape
+    # and the data itself
+    def _getLayout(self):
+        return (tuple(self._axisKeys), self._shape,
+                np.dtype(self.Input.meta.dtype),
+                self._getUpstreamBlockShape(), self.ChunkShape.ready())
+
+    # get the spatial chunk shape from the ChunkShape slot, or choose one
+    # from volume shape, dtype and upstream block shape
+    # in both cases, the chunk grid is aligned with the upstream block grid
+    # (no data is requested here, the automatic chunk shape is refined with
+    # a density sample in _refineChunkShape())
+    def _getChunkShape(self):
+        blockShape = self._getUpstreamBlockShape()
+        if self.ChunkShape.ready():
+            return snapToBlockShape(tuple(self.ChunkShape.value), blockShape,
+                                    self._shape[1:4])
+        return suggestChunkShape(self._shape[1:4],
+                                 self.Input.meta.dtype,
+                                 blockShape=blockShape)
+
+    # choose the automatic chunk shape again, taking the foreground density
+    # into account
+    # This is done on the first request instead of in setupOutputs(), which
+    # must not request data. Nothing was labeled yet, so the chunk grid can
+    # be replaced. The new shape is published in Output.meta.chunkShape.
+    def _refineChunkShape(self):
+        with self._chunkShapeLock:
+            if not self._chunkShapePending:
+                # another request was faster
+                return
+            blockShape = self._getUpstreamBlockShape()
+            chunkShape = suggestChunkShape(
+                self._shape[1:4], self.Input.meta.dtype,
+                blockShape=blockShape,
+                density=self._sampleDensity(blockShape))
+            if chunkShape != self._spatialChunkShape:
+                logger.debug("Refined chunk shape {} -> {}".format(
+                    self._spatialChunkShape, chunkShape))
+                self._spatialChunkShape = chunkShape
+                self._setDefaultInternals()
+                self.Output.meta.chunkShape = chunkShape
+            self._chunkShapePending = False
+
+    # the spatial part of the input's ideal_blockshape, in 'xyz' order
+    # (None if the input does not have a preferred block shape)
+    def _getUpstreamBlockShape(self):
+        blockShape = self.Input.meta.ideal_blockshape
+        if blockShape is None:
+            return None
+        keys = self.Input.meta.getAxisKeys()
+        return tuple(blockShape[keys.index(a)] if a in keys else 0
+                     for a in 'xyz')
+
+    # fraction of foreground voxels in a small sample of the first time slice
+    # and channel
+    # If the upstream block shape is known, the first upstream block is
+    # sampled, which is likely needed anyway (and does not touch other
+    # blocks). Otherwise, a block at the center of the volume is sampled.
+    def _sampleDensity(self, blockShape=None, edge=32):
+        shape = np.asarray(self._shape)
+        if blockShape is not None and all(b > 0 for b in blockShape):
+            extent = np.minimum(shape, (1,) + blockShape + (1,))
+            start = np.zeros_like(shape)
+        else:
+            extent = np.minimum(shape, (1, edge, edge, edge, 1))
+            start = (shape - extent)//2
+            start[0] = 0
+            start[4] = 0
+        roi = SubRegion(self.Input, start=tuple(start),
+                        stop=tuple(start + extent))
+        sample = self._getInput(roi)
+        return np.count_nonzero(sample)/float(sample.size)
+
+    # request a region of the input, and record the request in the runtime
+    # statistics
+    # @param roi region of interest in 'txyzc' order
+    # @returns a view of the data in 'txyzc' order
+    def _getInput(self, roi):
+        with self._stats.timer("timeUpstream"):
+            data = self.Input.get(self._toNativeRoi(roi)).wait()
+        self._stats.count("upstreamRequests")
+        self._stats.count("upstreamBytes", data.nbytes)
+        return self._toInternalView(data)
+
+    # view an array in the input's axis order as an array in 'txyzc' order
+    # (axes missing in the input are inserted as singletons, no data is
+    # copied)
+    def _toInternalView(self, array):
+        keys = self._axisKeys
+        array = np.asarray(array).view(np.ndarray)
+        array = array.transpose([keys.index(a) for a in _AXES if a in keys])
+        return array[tuple(slice(None) if a in keys else np.newaxis
+                           for a in _AXES)]
+
+    # convert a roi in the input's axis order to 'txyzc' order
+    def _toInternalRoi(self, roi):
+        keys = self._axisKeys
+        start = tuple(roi.start[keys.index(a)] if a in keys else 0
+                      for a in _AXES)
+        stop = tuple(roi.stop[keys.index(a)] if a in keys else 1
+                     for a in _AXES)
+        return SubRegion(self.Input, start=start, stop=stop)
+
+    # convert a roi in 'txyzc' order to the input's axis order
+    def _toNativeRoi(self, roi):
+        start = tuple(roi.start[_AXES.index(a)] for a in self._axisKeys)
+        stop = tuple(roi.stop[_AXES.index(a)] for a in self._axisKeys)
+        return SubRegion(self.Input, start=start, stop=stop)
+
     # create roi object from chunk index
     def _chunkIndexToRoi(self, index):
         shape = self._shape
@@ -437,6 +1156,14 @@ class OpLazyCC(Operator):
         else:
             return roiA, roiB
 
+    # convert a roi inside a chunk to a spatial slicing relative to the
+    # chunk's origin, as used by the LabelStore
+    def _chunkSlicing(self, chunkIndex, roi):
+        origin = self._chunkShape * np.asarray(chunkIndex)
+        start = np.asarray(roi.start) - origin
+        stop = np.asarray(roi.stop) - origin
+        return tuple(slice(a, b) for a, b in zip(start[1:4], stop[1:4]))
+
     # generate a list of adjacent chunks
     def _generateNeighbours(self, chunkIndex):
         n = []
@@ -456,9 +1183,8 @@ class OpLazyCC(Operator):
     # fills attributes with standard values, call on each setupOutputs
     def _setDefaultInternals(self):
         # chunk array shape calculation
-        #TODO change here when removing OpReorder
-        shape = self._Input.meta.shape
-        chunkShape = (1,) + self.ChunkShape.value + (1,)
+        shape = self._shape
+        chunkShape = (1,) + self._spatialChunkShape + (1,)
         assert len(shape) == len(chunkShape),\
             "Encountered an invalid chunkShape"
         f = lambda i: shape[i]//chunkShape[i] + (1 if shape[i] % chunkShape[i]
@@ -472,7 +1198,7 @@ class OpLazyCC(Operator):
 
         ### local labels ###
         # cache for local labels
-        self._cache = vigra.ChunkedArrayCompressed(shape, dtype=_LABEL_TYPE)
+        self._cache = LabelStore()
 
         ### global indices ###
         # offset (global labels - local labels) per chunk
@@ -480,6 +1206,8 @@ class OpLazyCC(Operator):
                                           dtype=_LABEL_TYPE)
         # keep track of number of indices in chunk (-1 == not labeled yet)
         self._numIndices = -np.ones(self._chunkArrayShape, dtype=np.int32)
+        # chunks without foreground, these are not stored in self._cache
+        self._isEmpty = np.zeros(self._chunkArrayShape, dtype=np.bool)
 
         # union find data structure, tells us for every global index to which
         # label it belongs
@@ -490,16 +1218,28 @@ class OpLazyCC(Operator):
         gen = partial(InfiniteLabelIterator, 1, dtype=_LABEL_TYPE)
         self._labelIterators = defaultdict(gen)
         self._globalToFinal = defaultdict(dict)
+        # slices whose union find indices were released (see _releaseSlice)
+        self._releasedSlices = set()
         self._isFinal = np.zeros(self._chunkArrayShape, dtype=np.bool)
+        # mapping of local labels to final labels for each final chunk
+        self._finalLabels = dict()
 
         ### algorithmic ###
 
-        # keep track of merged regions
-        self._mergeMap = defaultdict(list)
+        # keep track of merged regions, maps chunkA -> chunkB -> pairs of
+        # corresponding labels (see _merge)
+        self._mergeMap = defaultdict(dict)
 
         # locks that keep threads from changing a specific chunk
         self._chunk_locks = defaultdict(HardLock)
 
+        # output buffers for labeling, one per thread (see _labelBuffer)
+        self._labelBuffers = ThreadLocal()
+
+        # background requests for labeling chunks, per spatial position (see
+        # _prefetchLabel)
+        self._labelRequests = dict()
+
     # order a pair of chunk indices lexicographically
     # (ret[0] is top-left-in-front-of of ret[1])
     @staticmethod
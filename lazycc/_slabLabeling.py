@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+import numpy as np
+import vigra
+import traceback
+
+from multiprocessing import Process, Pipe
+
+from _mockup import UnionFindArray
+from _tools import uniquePairs
+from _opLazyCC import OpLazyCC, _LABEL_TYPE
+
+from lazyflow.graph import Graph
+
+
+# general approach
+# ================
+#
+# The volume is split into slabs along the x axis, each slab is handled by
+# its own worker process (a local stand-in for a cluster node):
+#     1. map: The worker labels its slab with OpLazyCC and sends back only
+#        the number of labels in the slab and its two boundary faces (labels
+#        and data).
+#     2. reduce: Labels of adjacent faces are merged in a global union find,
+#        which yields a compact relabeling table (slab label -> final label)
+#        for each worker.
+#     3. The workers apply their table to their own output.
+#
+
+## label a volume with several worker processes, one slab per process
+# @param volume 3d array with axes 'xyz'
+# @param numSlabs number of slabs (and worker processes)
+# @param chunkShape chunk shape for the OpLazyCC in each worker (None for
+#                   automatic choice)
+# @returns array of final labels, contiguous in [0, numLabels]
+# @throws RuntimeError if a worker fails
+def labelSlabs(volume, numSlabs=2, chunkShape=None):
+    volume = np.asarray(volume)
+    assert volume.ndim == 3, "Only 3d volumes are supported"
+    assert numSlabs > 0, "Need at least one slab"
+    bounds = np.linspace(0, volume.shape[0], min(numSlabs, volume.shape[0])+1)
+    bounds = bounds.astype(np.int)
+
+    workers = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        parentConn, childConn = Pipe()
+        p = Process(target=_labelSlab,
+                    args=(childConn, volume[start:stop], chunkShape))
+        p.start()
+        # only the worker may hold this end, otherwise recv() would not
+        # notice a worker that died
+        childConn.close()
+        workers.append((p, parentConn))
+
+    try:
+        # map
+        summaries = [_receive(conn) for p, conn in workers]
+
+        # reduce
+        tables = reduceSlabs(summaries)
+
+        # apply the relabeling tables
+        for (p, conn), table in zip(workers, tables):
+            conn.send(table)
+        result = np.empty(volume.shape, dtype=_LABEL_TYPE)
+        for (p, conn), start, stop in zip(workers, bounds[:-1], bounds[1:]):
+            result[start:stop] = _receive(conn)
+    except:
+        # the other workers would wait for their tables forever
+        for p, conn in workers:
+            p.terminate()
+        raise
+    finally:
+        for p, conn in workers:
+            conn.close()
+            p.join()
+    return result
+
+
+## merge the slab summaries into compact relabeling tables
+# @param summaries list of tuples (numLabels, firstLabels, lastLabels,
+#                  firstData, lastData) for adjacent slabs, where first* and
+#                  last* are the boundary faces at the low and high end of
+#                  the slab
+# @returns list of arrays, one per slab, that map slab labels to final
+#          labels (label 0 is kept)
+def reduceSlabs(summaries):
+    counts = np.asarray([s[0] for s in summaries], dtype=np.int64)
+    # global index of label 1 in each slab
+    offsets = np.concatenate(([1], 1 + np.cumsum(counts)[:-1]))
+    total = int(counts.sum())
+
+    # indices 1..total
+    uf = UnionFindArray(total + 1)
+
+    for i in range(len(summaries) - 1):
+        labelsA, dataA = summaries[i][2], summaries[i][4]
+        labelsB, dataB = summaries[i+1][1], summaries[i+1][3]
+        adjacent = (labelsA > 0) & (labelsB > 0) & (dataA == dataB)
+        pairsA, pairsB = uniquePairs(labelsA[adjacent], labelsB[adjacent])
+        for a, b in zip(pairsA, pairsB):
+            uf.makeUnion(int(a + offsets[i] - 1), int(b + offsets[i+1] - 1))
+
+    # contiguous final labels in the order of the representatives
+    roots = np.asarray([uf.findIndex(k) for k in range(1, total+1)],
+                       dtype=np.int64)
+    final = np.zeros((total+1,), dtype=_LABEL_TYPE)
+    if total > 0:
+        final[1:] = np.unique(roots, return_inverse=True)[1] + 1
+
+    tables = []
+    for offset, n in zip(offsets, counts):
+        table = np.zeros((n+1,), dtype=_LABEL_TYPE)
+        table[1:] = final[offset:offset+n]
+        tables.append(table)
+    return tables
+
+
+# an exception in a worker process, sent to the parent instead of a result
+class _SlabError(object):
+    def __init__(self, message):
+        self.message = message
+
+
+# receive a result from a worker, re-raise the worker's exceptions
+def _receive(conn):
+    try:
+        msg = conn.recv()
+    except EOFError:
+        raise RuntimeError("Slab worker exited unexpectedly")
+    if isinstance(msg, _SlabError):
+        raise RuntimeError("Slab worker failed:\n" + msg.message)
+    return msg
+
+
+# worker process, see labelSlabs()
+def _labelSlab(conn, slab, chunkShape):
+    try:
+        _labelSlabUnsafe(conn, slab, chunkShape)
+    except Exception:
+        conn.send(_SlabError(traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+# the actual work of a worker process, see _labelSlab()
+def _labelSlabUnsafe(conn, slab, chunkShape):
+    op = OpLazyCC(graph=Graph())
+    op.Input.setValue(vigra.taggedView(slab, axistags='xyz'))
+    if chunkShape is not None:
+        op.ChunkShape.setValue(chunkShape)
+    labels = op.Output[...].wait()
+    del op
+
+    # final labels of a single OpLazyCC are contiguous
+    numLabels = int(labels.max()) if labels.size > 0 else 0
+    conn.send((numLabels, labels[0], labels[-1], slab[0], slab[-1]))
+
+    table = conn.recv()
+    conn.send(table[labels])
@@ -21,6 +21,104 @@ class InfiniteLabelIterator(object):
         return a
 
 
+# chunks should occupy about this many bytes of input and local labels, the
+# default corresponds to a 64x64x64 chunk of uint8 data with uint32 labels
+_TARGET_CHUNK_BYTES = 64**3 * 5
+
+
+## suggest a chunk shape for labeling a volume lazily
+#
+# The number of voxels per chunk is chosen such that input and local labels
+# of one chunk occupy _TARGET_CHUNK_BYTES. Dense foreground leads to many
+# merges at chunk faces, so the volume is increased with the foreground
+# density. The voxels are distributed as isotropically as the volume shape
+# allows, and each edge is rounded to a multiple of the upstream block shape
+# (or to a power of 2, which matches the internal chunks of vigra's
+# ChunkedArrays, if there is no upstream block shape).
+#
+# @param shape spatial shape of the volume
+# @param dtype data type of the input
+# @param blockShape preferred block shape of the upstream data (0 or None
+#                   means no preference for an axis)
+# @param density fraction of foreground voxels in a sample of the data
+# @returns tuple with one edge length per axis of shape
+def suggestChunkShape(shape, dtype, blockShape=None, density=None):
+    shape = np.asarray(shape, dtype=np.int)
+    if blockShape is None:
+        blockShape = np.zeros_like(shape)
+    blockShape = np.asarray(blockShape, dtype=np.int)
+    assert len(blockShape) == len(shape), "Invalid block shape"
+
+    bytesPerVoxel = np.dtype(dtype).itemsize + np.dtype(np.uint32).itemsize
+    nVoxels = float(_TARGET_CHUNK_BYTES) / bytesPerVoxel
+    if density is not None:
+        nVoxels *= 1 + 3*density
+
+    # distribute the voxels isotropically, axes that are shorter than the
+    # isotropic edge are taken completely
+    edges = np.zeros(shape.shape, dtype=np.float64)
+    free = np.ones(shape.shape, dtype=np.bool)
+    while np.any(free):
+        edge = (nVoxels / np.prod(edges[~free]))**(1.0/free.sum())
+        short = free & (shape <= edge)
+        if not np.any(short):
+            edges[free] = edge
+            break
+        edges[short] = shape[short]
+        free &= ~short
+
+    # round to powers of 2 and then to block boundaries, axes that are taken
+    # completely stay as they are
+    chunkShape = []
+    for edge, extent, isFree in zip(edges, shape, free):
+        if not isFree:
+            edge = extent
+        else:
+            edge = 2**int(round(np.log2(max(edge, 1))))
+        chunkShape.append(int(min(edge, extent)))
+    return snapToBlockShape(chunkShape, blockShape, shape)
+
+
+## align a chunk shape with the block layout of the upstream data
+#
+# Each axis of the chunk shape is rounded to the nearest multiple of the
+# block shape (at least one block), such that the chunk grid is aligned with
+# the block grid and each upstream block is read by exactly one chunk.
+#
+# @param chunkShape the desired chunk shape
+# @param blockShape block shape of the upstream data (0 or None means no
+#                   block layout along an axis)
+# @param shape shape of the volume, chunks never exceed the volume
+# @returns tuple with one edge length per axis of chunkShape
+def snapToBlockShape(chunkShape, blockShape, shape):
+    if blockShape is None:
+        blockShape = (0,)*len(chunkShape)
+    assert len(chunkShape) == len(blockShape) == len(shape),\
+        "Dimensions of chunk shape, block shape and shape do not agree"
+    snapped = []
+    for edge, block, extent in zip(chunkShape, blockShape, shape):
+        if block > 0:
+            edge = max(1, int(round(float(edge)/block))) * block
+        snapped.append(int(min(edge, extent)))
+    return tuple(snapped)
+
+
+## remove duplicate pairs from two arrays of corresponding uint32 labels
+#
+# The pairs are packed into uint64 keys, such that np.unique can do the work.
+# @param a first labels of the pairs
+# @param b second labels of the pairs (same length as a)
+# @returns tuple (a, b) of uint32 arrays, pairs sorted lexicographically
+def uniquePairs(a, b):
+    a = np.asarray(a, dtype=np.uint64)
+    b = np.asarray(b, dtype=np.uint64)
+    assert a.shape == b.shape, "Need the same number of labels"
+    shift = np.uint64(32)
+    keys = np.unique((a << shift) | b)
+    return ((keys >> shift).astype(np.uint32),
+            (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+
+
 class LabelGraph(object):
 
     def __init__(self, shape):
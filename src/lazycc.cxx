@@ -96,8 +96,21 @@ void exportVigraUnionFindArray() {
 
 namespace vigra {
 
+// convert a list of label pairs to an array of shape (n, 2)
+template <class LabelType>
+NumpyAnyArray pairsToArray(std::vector<std::pair<LabelType, LabelType> > const & pairs)
+{
+    NumpyArray<2, LabelType> res(typename MultiArrayShape<2>::type(pairs.size(), 2));
+    for (std::size_t i=0; i<pairs.size(); i++)
+    {
+        res(i, 0) = pairs[i].first;
+        res(i, 1) = pairs[i].second;
+    }
+    return res;
+}
+
 template <class PixelType>
-inline void pythonMergeLabels3d(NumpyArray<3, Singleband<PixelType> > left,
+inline NumpyAnyArray pythonMergeLabels3d(NumpyArray<3, Singleband<PixelType> > left,
                  NumpyArray<3, Singleband<PixelType> > right,
                  NumpyArray<3, Singleband<npy_uint32> > leftLabels,
                  NumpyArray<3, Singleband<npy_uint32> > rightLabels,
@@ -105,15 +118,19 @@ inline void pythonMergeLabels3d(NumpyArray<3, Singleband<PixelType> > left,
                  NumpyArray<1, Singleband<npy_uint32> > rightMap,
                  UnionFindArray<npy_uint32> & unionFind) {
     
-    //PyAllowThreads _pythread;
-    mergeLabels<3, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind);
+    std::vector<std::pair<npy_uint32, npy_uint32> > pairs;
+    {
+        //PyAllowThreads _pythread;
+        mergeLabels<3, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind, pairs);
+    }
+    return pairsToArray(pairs);
 }
 
 VIGRA_PYTHON_MULTITYPE_FUNCTOR(pyMergeLabels3d, pythonMergeLabels3d)
 
 
 template <class PixelType>
-inline void pythonMergeLabels2d(NumpyArray<2, Singleband<PixelType> > left,
+inline NumpyAnyArray pythonMergeLabels2d(NumpyArray<2, Singleband<PixelType> > left,
                  NumpyArray<2, Singleband<PixelType> > right,
                  NumpyArray<2, Singleband<npy_uint32> > leftLabels,
                  NumpyArray<2, Singleband<npy_uint32> > rightLabels,
@@ -121,14 +138,18 @@ inline void pythonMergeLabels2d(NumpyArray<2, Singleband<PixelType> > left,
                  NumpyArray<1, Singleband<npy_uint32> > rightMap,
                  UnionFindArray<npy_uint32> & unionFind) {
     
-    //PyAllowThreads _pythread;
-    mergeLabels<2, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind);
+    std::vector<std::pair<npy_uint32, npy_uint32> > pairs;
+    {
+        //PyAllowThreads _pythread;
+        mergeLabels<2, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind, pairs);
+    }
+    return pairsToArray(pairs);
 }
 
 VIGRA_PYTHON_MULTITYPE_FUNCTOR(pyMergeLabels2d, pythonMergeLabels2d)
 
 template <class PixelType>
-inline void pythonMergeLabels1d(NumpyArray<1, Singleband<PixelType> > left,
+inline NumpyAnyArray pythonMergeLabels1d(NumpyArray<1, Singleband<PixelType> > left,
                  NumpyArray<1, Singleband<PixelType> > right,
                  NumpyArray<1, Singleband<npy_uint32> > leftLabels,
                  NumpyArray<1, Singleband<npy_uint32> > rightLabels,
@@ -136,15 +157,38 @@ inline void pythonMergeLabels1d(NumpyArray<1, Singleband<PixelType> > left,
                  NumpyArray<1, Singleband<npy_uint32> > rightMap,
                  UnionFindArray<npy_uint32> & unionFind) {
     
-    //PyAllowThreads _pythread;
-    mergeLabels<1, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind);
+    std::vector<std::pair<npy_uint32, npy_uint32> > pairs;
+    {
+        //PyAllowThreads _pythread;
+        mergeLabels<1, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind, pairs);
+    }
+    return pairsToArray(pairs);
 }
 
 VIGRA_PYTHON_MULTITYPE_FUNCTOR(pyMergeLabels1d, pythonMergeLabels1d)
 
 
 template <class PixelType>
-inline void pythonMergeLabelsRaw2d(NumpyArray<2, Singleband<PixelType> > left,
+inline NumpyAnyArray pythonMergeLabelsRaw3d(NumpyArray<3, Singleband<PixelType> > left,
+                                NumpyArray<3, Singleband<PixelType> > right,
+                                NumpyArray<3, Singleband<npy_uint32> > leftLabels,
+                                NumpyArray<3, Singleband<npy_uint32> > rightLabels,
+                                NumpyArray<1, Singleband<npy_uint32> > leftMap,
+                                NumpyArray<1, Singleband<npy_uint32> > rightMap,
+                                UnionFindArray<npy_uint32> & unionFind) {
+    
+    std::vector<std::pair<npy_uint32, npy_uint32> > pairs;
+    {
+        //PyAllowThreads _pythread;
+        mergeLabelsRaw<3, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind, pairs);
+    }
+    return pairsToArray(pairs);
+}
+
+VIGRA_PYTHON_MULTITYPE_FUNCTOR(pyMergeLabelsRaw3d, pythonMergeLabelsRaw3d)
+
+template <class PixelType>
+inline NumpyAnyArray pythonMergeLabelsRaw2d(NumpyArray<2, Singleband<PixelType> > left,
                                 NumpyArray<2, Singleband<PixelType> > right,
                                 NumpyArray<2, Singleband<npy_uint32> > leftLabels,
                                 NumpyArray<2, Singleband<npy_uint32> > rightLabels,
@@ -152,12 +196,35 @@ inline void pythonMergeLabelsRaw2d(NumpyArray<2, Singleband<PixelType> > left,
                                 NumpyArray<1, Singleband<npy_uint32> > rightMap,
                                 UnionFindArray<npy_uint32> & unionFind) {
     
-    //PyAllowThreads _pythread;
-    mergeLabelsRaw<2, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind);
+    std::vector<std::pair<npy_uint32, npy_uint32> > pairs;
+    {
+        //PyAllowThreads _pythread;
+        mergeLabelsRaw<2, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind, pairs);
+    }
+    return pairsToArray(pairs);
 }
 
 VIGRA_PYTHON_MULTITYPE_FUNCTOR(pyMergeLabelsRaw2d, pythonMergeLabelsRaw2d)
 
+template <class PixelType>
+inline NumpyAnyArray pythonMergeLabelsRaw1d(NumpyArray<1, Singleband<PixelType> > left,
+                                NumpyArray<1, Singleband<PixelType> > right,
+                                NumpyArray<1, Singleband<npy_uint32> > leftLabels,
+                                NumpyArray<1, Singleband<npy_uint32> > rightLabels,
+                                NumpyArray<1, Singleband<npy_uint32> > leftMap,
+                                NumpyArray<1, Singleband<npy_uint32> > rightMap,
+                                UnionFindArray<npy_uint32> & unionFind) {
+    
+    std::vector<std::pair<npy_uint32, npy_uint32> > pairs;
+    {
+        //PyAllowThreads _pythread;
+        mergeLabelsRaw<1, PixelType, npy_uint32>(left, right, leftLabels, rightLabels, leftMap, rightMap, unionFind, pairs);
+    }
+    return pairsToArray(pairs);
+}
+
+VIGRA_PYTHON_MULTITYPE_FUNCTOR(pyMergeLabelsRaw1d, pythonMergeLabelsRaw1d)
+
 
 } // namespace vigra
 
@@ -173,7 +240,9 @@ void exportMergeLabels() {
               arg("left_mapping"), arg("right_mapping"),
               arg("UnionFind")
              ),
-             "Bla\n");
+             "Join the labels of two adjacent hyperplanes in the UnionFind.\n"
+             "Returns the unique pairs (left label, right label) of adjacent\n"
+             "local labels as an array of shape (n, 2).\n");
     
     
     multidef("mergeLabels", 
@@ -184,7 +253,9 @@ void exportMergeLabels() {
               arg("left_mapping"), arg("right_mapping"),
               arg("UnionFind")
              ),
-             "Bla\n");
+             "Join the labels of two adjacent hyperplanes in the UnionFind.\n"
+             "Returns the unique pairs (left label, right label) of adjacent\n"
+             "local labels as an array of shape (n, 2).\n");
     
     
     multidef("mergeLabels", 
@@ -195,7 +266,22 @@ void exportMergeLabels() {
               arg("left_mapping"), arg("right_mapping"),
               arg("UnionFind")
              ),
-             "Bla\n");
+             "Join the labels of two adjacent hyperplanes in the UnionFind.\n"
+             "Returns the unique pairs (left label, right label) of adjacent\n"
+             "local labels as an array of shape (n, 2).\n");
+    
+    
+    multidef("mergeLabelsRaw", 
+             pyMergeLabelsRaw3d<npy_uint8, npy_uint32, npy_uint64, float>(),
+             (
+                 arg("left_image"), arg("right_image"),
+              arg("left_labels"), arg("right_labels"),
+              arg("left_mapping"), arg("right_mapping"),
+              arg("UnionFind")
+             ),
+             "Join the labels of two adjacent hyperplanes in the UnionFind.\n"
+             "Returns the unique pairs (left label, right label) of adjacent\n"
+             "local labels as an array of shape (n, 2).\n");
     
     
     multidef("mergeLabelsRaw", 
@@ -206,7 +292,22 @@ void exportMergeLabels() {
               arg("left_mapping"), arg("right_mapping"),
               arg("UnionFind")
              ),
-             "Bla\n");
+             "Join the labels of two adjacent hyperplanes in the UnionFind.\n"
+             "Returns the unique pairs (left label, right label) of adjacent\n"
+             "local labels as an array of shape (n, 2).\n");
+    
+    
+    multidef("mergeLabelsRaw", 
+             pyMergeLabelsRaw1d<npy_uint8, npy_uint32, npy_uint64, float>(),
+             (
+                 arg("left_image"), arg("right_image"),
+              arg("left_labels"), arg("right_labels"),
+              arg("left_mapping"), arg("right_mapping"),
+              arg("UnionFind")
+             ),
+             "Join the labels of two adjacent hyperplanes in the UnionFind.\n"
+             "Returns the unique pairs (left label, right label) of adjacent\n"
+             "local labels as an array of shape (n, 2).\n");
     
    
     /*
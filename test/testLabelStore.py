@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+import unittest
+import numpy as np
+
+from lazycc._labelStore import LabelStore
+
+
+class TestLabelStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = LabelStore()
+
+    def testRoundTrip(self):
+        labels = np.random.randint(0, 100, size=(10, 11, 12))
+        self.store.store((0, 1, 2, 3, 0), labels, 99)
+        out = self.store.read((0, 1, 2, 3, 0))
+        np.testing.assert_array_equal(out, labels)
+        assert out.dtype == np.uint32
+
+    def testNarrowTypes(self):
+        labels = np.zeros((5, 5, 5), dtype=np.uint32)
+        for numLabels, dtype in ((255, np.uint8), (256, np.uint16),
+                                 (2**16, np.uint32)):
+            labels[0, 0, 0] = numLabels
+            self.store.store(numLabels, labels, numLabels)
+            assert self.store.storageType(numLabels) == dtype
+            out = self.store.read(numLabels, dtype=None)
+            assert out.dtype == dtype
+            assert out[0, 0, 0] == numLabels
+
+    def testReadPart(self):
+        labels = np.arange(4*5*6).reshape((4, 5, 6)) % 200
+        self.store.store(0, labels, 199)
+        key = (slice(1, 3), slice(4, 5), slice(None))
+        np.testing.assert_array_equal(self.store.read(0, key), labels[key])
+
+    def testFortranOrder(self):
+        # vigra arrays are usually in fortran order
+        labels = np.asfortranarray(np.arange(3*4*5).reshape((3, 4, 5)))
+        self.store.store(0, labels, labels.max())
+        np.testing.assert_array_equal(self.store.read(0), labels)
+
+    def testDataBytes(self):
+        assert self.store.data_bytes == 0
+        assert 0 not in self.store
+        labels = np.zeros((64, 64, 64), dtype=np.uint32)
+        labels[10:20, 10:20, 10:20] = 1
+        self.store.store(0, labels, 1)
+        assert 0 in self.store
+        # uint8 storage and compression
+        assert 0 < self.store.data_bytes < labels.size
+
+    def testSparse(self):
+        labels = np.zeros((20, 21, 22), dtype=np.uint32)
+        labels[3:5, 4:9, 2:3] = 1
+        labels[10, 10, 10:22] = 300
+        labels[19, 20, 21] = 2
+        self.store.store(0, labels, 300)
+        assert self.store.isSparse(0)
+        assert self.store.storageType(0) == np.uint16
+        np.testing.assert_array_equal(self.store.read(0), labels)
+
+        # faces
+        for key in ((slice(19, 20), slice(None), slice(None)),
+                    (slice(None), slice(None), slice(21, 22)),
+                    (slice(None), slice(0, 1), slice(None))):
+            np.testing.assert_array_equal(self.store.read(0, key),
+                                          labels[key])
+
+    def testSparseMapInto(self):
+        labels = np.zeros((10, 10, 10), dtype=np.uint32)
+        labels[1:3, 1:3, 1:3] = 1
+        labels[5:9, 5, 5] = 2
+        self.store.store(0, labels, 2)
+        assert self.store.isSparse(0)
+        mapping = np.asarray([0, 7, 5], dtype=np.uint32)
+        key = (slice(2, 8), slice(None), slice(1, 6))
+        out = np.ones((6, 10, 5), dtype=np.uint32)
+        self.store.mapInto(0, key, mapping, out)
+        np.testing.assert_array_equal(out, mapping[labels[key]])
+
+    def testDenseMapInto(self):
+        labels = np.random.randint(0, 4, size=(10, 10, 10))
+        self.store.store(0, labels, 3)
+        assert not self.store.isSparse(0)
+        mapping = np.asarray([0, 3, 2, 1], dtype=np.uint32)
+        out = np.zeros((10, 10, 10), dtype=np.uint32)
+        self.store.mapInto(0, None, mapping, out)
+        np.testing.assert_array_equal(out, mapping[labels])
+
+    def testNumLabels(self):
+        sparse = np.zeros((10, 10, 10), dtype=np.uint32)
+        sparse[1:3, 1:3, 1:3] = 300
+        dense = np.random.randint(1, 4, size=(10, 10, 10))
+        assert self.store.store(0, sparse) == 300
+        assert self.store.isSparse(0)
+        assert self.store.storageType(0) == np.uint16
+        assert self.store.store(1, dense) == dense.max()
+        assert not self.store.isSparse(1)
+        # also copies the labels
+        dense[:] = 0
+        assert self.store.read(1).max() > 0
+
+    def testKnownForeground(self):
+        labels = np.zeros((10, 10, 10), dtype=np.uint32)
+        labels[:5] = 1
+        # the caller's count decides between sparse and dense storage
+        self.store.store(0, labels, 1, numForeground=10)
+        assert self.store.isSparse(0)
+        self.store.store(1, labels, 1, numForeground=500)
+        assert not self.store.isSparse(1)
+        np.testing.assert_array_equal(self.store.read(0), labels)
+        np.testing.assert_array_equal(self.store.read(1), labels)
+
+    def testDecodedCache(self):
+        store = LabelStore(decodedChunks=2)
+        labels = np.random.randint(1, 4, size=(10, 10, 10))
+        for i in range(3):
+            store.store(i, labels + i)
+        assert store.decoded_bytes == 0
+        for i in range(3):
+            np.testing.assert_array_equal(store.read(i), labels + i)
+        # only the two most recently used chunks are kept
+        assert store.decoded_bytes == 2*labels.size
+
+        # replaced chunks are not read from the cache
+        store.store(2, labels + 5)
+        np.testing.assert_array_equal(store.read(2), labels + 5)
+        key = (slice(None), slice(3, 4), slice(None))
+        np.testing.assert_array_equal(store.read(2, key), labels[key] + 5)
+        store.discard(2)
+        assert store.decoded_bytes == labels.size
@@ -151,6 +151,18 @@ struct MergeLabelTest
         should(uf.findLabel(6) != uf.findLabel(2));
     }
     
+    void mergeLabelPairsTest()
+    {
+        vigra::UnionFindArray<LabelType> uf(rightMap[3]+1);
+        std::vector<std::pair<LabelType, LabelType> > pairs;
+        vigra::mergeLabels<3, PixelType, LabelType>(left, right, leftLabels, rightLabels, leftMap, rightMap, uf, pairs);
+        shouldEqual(pairs.size(), 2u);
+        should(pairs[0] == std::make_pair(LabelType(1), LabelType(1)));
+        should(pairs[1] == std::make_pair(LabelType(3), LabelType(3)));
+        should(uf.findLabel(5) == uf.findLabel(1));
+        should(uf.findLabel(7) == uf.findLabel(3));
+    }
+    
     template <class Array>
     void printMat(Array a)
     {
@@ -273,6 +285,7 @@ struct MergeLabelTestSuite
     {
         add( testCase( &MergeLabelTest::mergeLabelTest2d));
         add( testCase( &MergeLabelTest::mergeLabelTest3d));
+        add( testCase( &MergeLabelTest::mergeLabelPairsTest));
         add( testCase( &MergeLabelTestMore::mergeLabelTest));
     }
 };
@@ -8,6 +8,8 @@ import unittest
 import numpy as np
 import vigra
 
+from numpy.testing import assert_array_equal
+
 from lazycc import mergeLabels, UnionFindArray
 from helpers import assertEquivalentLabeling
 
@@ -62,3 +64,70 @@ class TestMergeLabels(unittest.TestCase):
 
                     mergeLabels(x, y, xl, yl, xm, ym, uf)
 
+
+    def testUniquePairs(self):
+        from lazycc._merge import mergeLabels as pyMergeLabels
+        # one object covers the whole face, another one a single line
+        left = np.ones((64, 64), dtype=np.uint8)
+        left[10, :] = 2
+        right = left.copy()
+        llabels = np.ones((64, 64), dtype=np.uint32)
+        llabels[10, :] = 2
+        rlabels = np.ones((64, 64), dtype=np.uint32)*3
+        rlabels[10, :] = 1
+        lmap = np.arange(3, dtype=np.uint32)
+        rmap = np.arange(4, dtype=np.uint32) + 2
+        rmap[0] = 0
+
+        for merge in (mergeLabels, pyMergeLabels):
+            uf = UnionFindArray(rmap)
+            pairs = merge(left, right, llabels, rlabels, lmap, rmap, uf)
+            assert_array_equal(pairs, [[1, 3], [2, 1]])
+            assert uf.findLabel(1) == uf.findLabel(5)
+            assert uf.findLabel(2) == uf.findLabel(3)
+            assert uf.findLabel(1) != uf.findLabel(2)
+
+    def testRawStrided(self):
+        from lazycc import mergeLabelsRaw
+        for d in range(1, 4):
+            shape = (6,)*d
+            # faces of chunks along an inner axis, like
+            # makeFaces(strided=True) in benchmark/mergeBenchmark.py: there
+            # are gaps between the lines of the face, or between all of its
+            # elements if the face is taken along the innermost axis
+            for axis in range(1, d+1):
+                chunkShape = shape[:axis] + (7,) + shape[axis:]
+                x = np.random.randint(3, size=chunkShape).astype(np.uint8)
+                xl = np.random.randint(1, 5, size=chunkShape)
+                xl = xl.astype(np.uint32)
+                a = (slice(None),)*axis + (2,)
+                b = (slice(None),)*axis + (3,)
+                x, y = x[a], x[b]
+                xl, yl = xl[a], xl[b]
+                y[0] = x[0]
+                for arr in (x, y, xl, yl):
+                    assert not arr.flags.c_contiguous and \
+                        not arr.flags.f_contiguous
+                    if axis == d:
+                        assert min(arr.strides) > arr.itemsize
+                self._checkRaw(mergeLabelsRaw, x, y, xl, yl)
+
+    # compare mergeLabelsRaw with mergeLabels, also for transposed faces
+    def _checkRaw(self, mergeLabelsRaw, x, y, xl, yl):
+        xm = np.arange(5, dtype=np.uint32)
+        ym = np.arange(5, dtype=np.uint32) + 4
+        ym[0] = 0
+
+        uf1 = UnionFindArray(ym)
+        pairs1 = mergeLabels(x, y, xl, yl, xm, ym, uf1)
+        uf2 = UnionFindArray(ym)
+        pairs2 = mergeLabelsRaw(x, y, xl, yl, xm, ym, uf2)
+        uf3 = UnionFindArray(ym)
+        pairs3 = mergeLabelsRaw(x.T, y.T, xl.T, yl.T, xm, ym, uf3)
+
+        assert len(pairs1) > 0
+        assert_array_equal(pairs1, pairs2)
+        assert_array_equal(pairs1, pairs3)
+        for i in range(9):
+            assert uf1.findLabel(i) == uf2.findLabel(i)
+            assert uf1.findLabel(i) == uf3.findLabel(i)
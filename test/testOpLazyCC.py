@@ -2,6 +2,9 @@
 # coding: utf-8
 # author: Markus Döring
 
+import os
+import json
+import tempfile
 import numpy as np
 import vigra
 import unittest
@@ -154,6 +157,45 @@ class TestOpLazyCC(unittest.TestCase):
 
         assert np.all(out1 != out2)
 
+    def testParallelPartialAndFullRequests(self):
+        vol = np.zeros((200, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:150, 20:30, :] = 1
+        vol[20:30, 10:90, 2:8] = 2
+        vol[100:190, 60:70, :] = 1
+
+        for i in range(5):
+            op = OpLabelVolume(graph=Graph())
+            op.Input.setValue(vol)
+            op.ChunkShape.setValue((25, 25, 10))
+
+            # partial requests map chunks one by one while the full request
+            # finalizes and releases the whole slice
+            reqs = [op.Output[x:x+25, ...] for x in range(0, 200, 25)]
+            reqs.append(op.Output[...])
+            [r.submit() for r in reqs]
+            out = [r.wait() for r in reqs]
+
+            assertEquivalentLabeling(vol, out[-1])
+            assert_array_equal(np.concatenate(out[:-1]), out[-1])
+
+    def testGlobalToFinal(self):
+        vol = np.zeros((10, 10, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        a = op._uf.makeNewIndex()
+        b = op._uf.makeNewIndex()
+
+        # b gets final label 1 first, then a gets final label 2, which
+        # must not be confused with index 2 == b
+        labels = np.asarray([0, b], dtype=np.uint32)
+        op.globalToFinal(0, 0, labels)
+        assert_array_equal(labels, [0, 1])
+        labels = np.asarray([0, a, b], dtype=np.uint32)
+        op.globalToFinal(0, 0, labels)
+        assert_array_equal(labels, [0, 2, 1])
+
     def testSetDirty(self):
         g = Graph()
         vol = np.zeros((200, 100, 10))
@@ -204,6 +246,357 @@ class TestOpLazyCC(unittest.TestCase):
         out2 = op.Output[:1, :1].wait()
         assert np.all(out2 > 0)
 
+    def testKeepStateOnReconnect(self):
+        g = Graph()
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:60, 20:30, :] = 1
+
+        opPiper = OpArrayPiper(graph=g)
+        opPiper.Input.setValue(vol)
+        opCount = OpExecuteCounter(graph=g)
+        opCount.Input.connect(opPiper.Output)
+
+        op = OpLabelVolume(graph=g)
+        op.Input.connect(opPiper.Output)
+        op.ChunkShape.setValue((50, 50, 10))
+        out1 = op.Output[...].wait()
+
+        # same data, shape and chunk grid
+        op.Input.connect(opCount.Output)
+        op.resetStatistics()
+        out2 = op.Output[...].wait()
+        assert_array_equal(out1, out2)
+        assert op.getStatistics()["chunksLabeled"] == 0
+        assert opCount.numCalls == 0
+
+        # a different chunk grid needs a new labeling
+        op.ChunkShape.setValue((25, 50, 10))
+        out3 = op.Output[...].wait()
+        assertEquivalentLabeling(vol, out3)
+        assert op.getStatistics()["chunksLabeled"] == 8
+
+    def testAutomaticChunkShape(self):
+        vol = np.zeros((1000, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[20:400, 10:30, 2:4] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+
+        chunkShape = op.Output.meta.chunkShape
+        assert len(chunkShape) == 3
+        assert all(0 < c <= s for c, s in zip(chunkShape, vol.shape))
+        # setupOutputs must not request data
+        assert op.getStatistics()["upstreamRequests"] == 0
+
+        out = op.Output[...].wait()
+        out = vigra.taggedView(out, axistags=op.Output.meta.axistags)
+        assertEquivalentLabeling(vol, out)
+
+        # the chunk shape was refined with a density sample
+        chunkShape = op.Output.meta.chunkShape
+        assert len(chunkShape) == 3
+        assert all(0 < c <= s for c, s in zip(chunkShape, vol.shape))
+
+        op.ChunkShape.setValue((100, 10, 10))
+        assert op.Output.meta.chunkShape == (100, 10, 10)
+
+    def testAlignWithUpstreamBlocks(self):
+        g = Graph()
+        vol = np.zeros((9, 9, 1), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[1:8, 2, 0] = 1
+
+        opCount = OpExecuteCounter(graph=g)
+        opCount.Input.setValue(vol)
+
+        opCache = OpCompressedCache(graph=g)
+        opCache.Input.connect(opCount.Output)
+        opCache.BlockShape.setValue((4, 4, 1))
+
+        op = OpLabelVolume(graph=g)
+        op.Input.connect(opCache.Output)
+        op.ChunkShape.setValue((3, 3, 1))
+        assert op.Output.meta.chunkShape == (4, 4, 1),\
+            str(op.Output.meta.chunkShape)
+
+        out = op.Output[...].wait()
+        out = vigra.taggedView(out, axistags=op.Output.meta.axistags)
+        assertEquivalentLabeling(vol, out)
+        # one request per upstream block
+        assert opCount.numCalls == 9, str(opCount.numCalls)
+
+    def testPrefetchLabelsEachChunkOnce(self):
+        g = Graph()
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[5:95, 5:95, 2:8] = 1
+        vol[30:50, 30:50, :] = 0
+
+        opCount = OpExecuteCounter(graph=g)
+        opCount.Input.setValue(vol)
+
+        opCache = OpCompressedCache(graph=g)
+        opCache.Input.connect(opCount.Output)
+        opCache.BlockShape.setValue((25, 25, 10))
+
+        op = OpLabelVolume(graph=g)
+        op.Input.connect(opCache.Output)
+        op.ChunkShape.setValue((25, 25, 10))
+        op.resetStatistics()
+
+        reqs = [op.Output[:25, :25, :], op.Output[75:, 75:, :]]
+        [r.submit() for r in reqs]
+        out = [r.wait() for r in reqs]
+        assert out[0][10, 10, 5] == out[1][10, 10, 5]
+
+        # the object touches all chunks, but each is labeled only once
+        assert op.getStatistics()["chunksLabeled"] == 16
+        assert opCount.numCalls == 16
+
+    def testGrowFromHigherIndexOverMergedFace(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        # a bar through the chunks (0, 0) ... (3, 0)
+        vol[:, 5:10, :] = 1
+        # two dots that come before the bar in chunk (1, 0) in any scan
+        # order, such that the bar has different local labels in chunks
+        # (1, 0) and (2, 0)
+        vol[25, 0, 0] = 1
+        vol[27, 0, 0] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((25, 25, 10))
+
+        # the face between (1, 0) and (2, 0) is merged before (e.g. for
+        # another channel), region growing has to use the cached pairs
+        left, right = (0, 1, 0, 0, 0), (0, 2, 0, 0, 0)
+        op._label(left)
+        op._label(right)
+        op._merge(left, right)
+
+        # the bar is grown from (3, 0) towards lower indices, i.e. the
+        # current chunk is always the second one of the ordered pair
+        part = op.Output[75:, :25, :].wait()
+        out = op.Output[...].wait()
+        assertEquivalentLabeling(vol, out)
+        assert_array_equal(part, out[75:, :25, :])
+        assert len(np.unique(out[:, 5:10, :])) == 1
+
+    def testGrowPriority(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[90:, 90:, :] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((25, 25, 10))
+        op._label((0, 3, 3, 0, 0))
+
+        # requested region first, then labeled chunks, then by distance
+        roiChunks = frozenset([(0, 2, 2, 0, 0)])
+        expected = [(0, 2, 2, 0, 0), (0, 3, 3, 0, 0),
+                    (0, 0, 1, 0, 0), (0, 1, 1, 0, 0)]
+        priorities = [op._growPriority(c, (0, 0, 0, 0, 0), roiChunks)
+                      for c in reversed(expected)]
+        assert [p[-1] for p in sorted(priorities)] == expected
+
+    def testCoalescedRequests(self):
+        g = Graph()
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[10:20, 10:20, :] = 1
+        vol[10:20, 60:70, :] = 1
+
+        opCount = OpExecuteCounter(graph=g)
+        opCount.Input.setValue(vol)
+
+        op = OpLabelVolume(graph=g)
+        op.Input.connect(opCount.Output)
+        op.ChunkShape.setValue((25, 25, 10))
+        opCount.numCalls = 0
+        op.resetStatistics()
+
+        out = op.Output[...].wait()
+        out = vigra.taggedView(out, axistags=op.Output.meta.axistags)
+        assert len(set(out.flat)) == 3
+
+        # 16 chunks in 4 runs, no objects touch a chunk boundary
+        assert opCount.numCalls == 4, str(opCount.numCalls)
+        assert op.getStatistics()["upstreamRequests"] == 4
+
+    def testChannelsTogether(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol[5:95, 20:30, 2:8] = 1
+        vol[40:60, 30:90, 2:8] = 1
+        vol[10:20, 60:70, :] = 1
+        multi = np.zeros(vol.shape + (3,), dtype=np.uint8)
+        for c in range(3):
+            multi[..., c] = vol * (c+1)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        multi = vigra.taggedView(multi, axistags='xyzc')
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(multi)
+        op.ChunkShape.setValue((25, 25, 10))
+        part = op.Output[:25, :25, ...].wait()
+        out = op.Output[...].wait()
+
+        # each channel is labeled on its own, from the shared requests
+        for c in range(3):
+            assertEquivalentLabeling(vol, out[..., c])
+            assertEquivalentLabeling(vol[:25, :25, :], part[..., c])
+        assert_array_equal(part, out[:25, :25, ...])
+
+    def testIterLabels(self):
+        vol = np.zeros((10, 100, 90), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='zyx')
+        vol[:, 5:95, 5:10] = 1
+        vol[:, 5:10, 5:85] = 1
+        vol[2:8, 60:70, 60:70] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((25, 25, 10))
+
+        roi = SubRegion(op.Output, start=(0, 10, 20), stop=(10, 80, 90))
+        out = np.zeros((10, 70, 70), dtype=np.uint32)
+        covered = np.zeros(out.shape, dtype=np.bool)
+        numPieces = 0
+        for pieceRoi, labels in op.iterLabels(roi, window=2):
+            s = tuple(slice(a - o, b - o) for a, b, o in
+                      zip(pieceRoi.start, pieceRoi.stop, roi.start))
+            assert not np.any(covered[s])
+            covered[s] = True
+            out[s] = labels
+            numPieces += 1
+        assert np.all(covered)
+        # 4x4 chunks intersect the region
+        assert numPieces == 16, str(numPieces)
+
+        full = op.Output[...].wait()
+        assert_array_equal(out, full[:, 10:80, 20:90])
+
+    def testStatistics(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:60, 20:30, :] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((50, 50, 10))
+
+        op.Output[...].wait()
+        stats = op.getStatistics()
+        assert stats["chunksLabeled"] == 4, str(stats)
+        # the object spans two chunks
+        assert stats["makeUnionCalls"] > 0, str(stats)
+        assert stats["unionFindSize"] == 2, str(stats)
+        assert stats["upstreamBytes"] >= vol.nbytes, str(stats)
+        assert stats["timeLabel"] > 0, str(stats)
+
+        op.resetStatistics()
+        op.Output[...].wait()
+        stats = op.getStatistics()
+        assert stats["chunksLabeled"] == 0, str(stats)
+        assert stats["upstreamBytes"] == 0, str(stats)
+
+    def testFinalizeSlice(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:60, 20:30, :] = 1
+        vol[70:80, 20:90, 2:5] = 1
+        vol[10:20, 60:70, :] = 2
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((25, 25, 10))
+
+        out = op.Output[...].wait()
+        assertEquivalentLabeling(vol, out)
+        assert set(out.flat) == set(range(4))
+        assert op.getStatistics()["timeFinalize"] > 0
+
+        # the final labels are kept for later requests
+        part = op.Output[70:80, 20:90, :].wait()
+        assert_array_equal(part, out[70:80, 20:90, :])
+
+    def testReleaseUnionFind(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:60, 20:30, :] = 1
+        vol[10:20, 60:70, :] = 2
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((50, 50, 10))
+
+        # the slice is finalized chunk by chunk
+        out = np.zeros(vol.shape, dtype=np.uint32)
+        out[:50, ...] = op.Output[:50, ...].wait()
+        assert op.getStatistics()["unionFindReleased"] == 0
+        out[50:, ...] = op.Output[50:, ...].wait()
+        assertEquivalentLabeling(vol, out)
+
+        stats = op.getStatistics()
+        assert stats["unionFindReleased"] == 3, str(stats)
+        # only the background index is left
+        assert len(op._uf._map) == 1
+
+        # the final labels are still available
+        assert_array_equal(op.Output[...].wait(), out)
+
+    def testEmptyChunks(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:60, 20:30, :] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((50, 50, 10))
+
+        out = op.Output[...].wait()
+        assertEquivalentLabeling(vol, out)
+        stats = op.getStatistics()
+        assert stats["chunksLabeled"] == 4, str(stats)
+        # the chunks with y >= 50 are empty
+        assert stats["emptyChunks"] == 2, str(stats)
+        assert (0, 0, 1, 0, 0) not in op._cache
+        assert (0, 0, 0, 0, 0) in op._cache
+
+    def testTracing(self):
+        vol = np.zeros((100, 100, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[:60, 20:30, :] = 1
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((50, 50, 10))
+
+        op.startTracing()
+        op.Output[...].wait()
+        op.stopTracing()
+
+        fd, filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            op.writeTrace(filename)
+            with open(filename) as f:
+                trace = json.load(f)
+        finally:
+            os.remove(filename)
+
+        events = trace["traceEvents"]
+        names = set(e["name"] for e in events)
+        for name in ("growRegion", "_label", "_merge", "_mapChunk"):
+            assert name in names, "no span for {}".format(name)
+        for e in events:
+            if e["name"] == "growRegion":
+                assert "ticket" in e["args"]
+                assert len(e["args"]["chunk"]) == 5
+
     @unittest.skip("too costly")
     def testFromDataset(self):
         shape = (500, 500, 500)
@@ -332,6 +725,34 @@ class TestOpLazyCC(unittest.TestCase):
         out = vigra.taggedView(out, axistags=op.Output.meta.axistags)
         assert np.all(out[1, :7, :7, ...] == 0)
 
+    def testIterFrames(self):
+        vol = np.zeros((5, 20, 20, 1), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='txyz')
+        for t in range(5):
+            vol[t, 2*t:2*t+8, 5:15, :] = 1
+            vol[t, 15:, 15:, :] = 2
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol)
+        op.ChunkShape.setValue((10, 10, 1))
+
+        frames = list(op.iterFrames(window=2))
+        assert [t for t, labels in frames] == range(5)
+        for t, labels in frames:
+            assert labels.shape == (1, 20, 20, 1)
+            assertEquivalentLabeling(vol[t], labels[0])
+
+        # nothing of the movie is kept
+        assert op._cache.data_bytes == 0
+        assert len(op._uf._map) == 1
+        assert len(op._finalLabels) == 0
+        assert len(op._chunk_locks) == 0
+        assert np.all(op._numIndices < 0)
+
+        # released frames are labeled again
+        out = op.Output[2:3, ...].wait()
+        assertEquivalentLabeling(vol[2], out[0])
+
     def testStrangeDim(self):
         vol = np.zeros((2, 10, 10, 1, 3))
         vol = vol.astype(np.uint8)
@@ -350,6 +771,26 @@ class TestOpLazyCC(unittest.TestCase):
         out = out.withAxes(*'txyzc')
         assert np.all(out[1, 3:7, 3:7, ...] > 0)
 
+    def testNativeAxisOrder(self):
+        vol = np.zeros((100, 60, 10), dtype=np.uint8)
+        vol = vigra.taggedView(vol, axistags='xyz')
+        vol[20:80, 10:30, 2:4] = 1
+        vol[10:20, 40:60, 5:] = 2
+
+        op = OpLabelVolume(graph=Graph())
+        op.Input.setValue(vol.withAxes(*'zyx'))
+        op.ChunkShape.setValue((30, 20, 5))
+
+        assert op.Output.meta.getAxisKeys() == list('zyx')
+        assert op.Output.meta.shape == (10, 60, 100)
+        out = op.Output[...].wait()
+        out = vigra.taggedView(out, axistags='zyx').withAxes(*'xyz')
+        assertEquivalentLabeling(vol, out)
+
+        part = op.Output[2:8, 10:30, 20:50].wait()
+        assert_array_equal(part,
+                           out.withAxes(*'zyx')[2:8, 10:30, 20:50])
+
 
 class OpExecuteCounter(OpArrayPiper):
 
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: utf-8
+# author: Markus Döring
+
+import unittest
+import numpy as np
+import vigra
+
+from lazycc import labelSlabs
+from lazycc._slabLabeling import reduceSlabs
+from helpers import assertEquivalentLabeling
+
+
+class TestSlabLabeling(unittest.TestCase):
+
+    def setUp(self):
+        vol = np.zeros((60, 50, 10), dtype=np.uint8)
+        # crosses all slabs
+        vol[5:55, 10:15, 2:8] = 1
+        # only in the first slab
+        vol[2:8, 30:40, :] = 2
+        # touches the first object, but has a different value
+        vol[30:40, 15:25, 2:8] = 3
+        # in the last slab
+        vol[50:60, 40:45, 1:2] = 1
+        self.vol = vigra.taggedView(vol, axistags='xyz')
+
+    def testLabelSlabs(self):
+        for numSlabs in (1, 3, 4):
+            out = labelSlabs(self.vol, numSlabs=numSlabs,
+                             chunkShape=(10, 25, 10))
+            assert out.max() == 4, str(out.max())
+            reference = vigra.analysis.labelVolumeWithBackground(self.vol)
+            assertEquivalentLabeling(reference, out)
+
+    def testReduce(self):
+        # two slabs with 2 labels each, label 1 of the first slab continues
+        # as label 2 in the second slab
+        labelsA = np.asarray([[0, 1], [2, 0]], dtype=np.uint32)
+        labelsB = np.asarray([[0, 2], [1, 0]], dtype=np.uint32)
+        dataA = np.asarray([[0, 1], [1, 0]], dtype=np.uint8)
+        dataB = np.asarray([[0, 1], [3, 0]], dtype=np.uint8)
+        slabA = (2, labelsA, labelsA, dataA, dataA)
+        slabB = (2, labelsB, labelsB, dataB, dataB)
+        tables = reduceSlabs([slabA, slabB])
+        assert len(tables) == 2
+        np.testing.assert_array_equal(tables[0], [0, 1, 2])
+        np.testing.assert_array_equal(tables[1], [0, 3, 1])
+
+    def testFailingWorker(self):
+        # OpLazyCC refuses float data, the worker has to report that
+        vol = self.vol.astype(np.float32)
+        with self.assertRaises(RuntimeError):
+            labelSlabs(vol, numSlabs=3)
@@ -3,8 +3,10 @@
 # author: Markus Döring
 
 import unittest
+import numpy as np
 
 from lazycc import LabelGraph
+from lazycc._tools import suggestChunkShape, snapToBlockShape, uniquePairs
 
 
 class TestLabelGraph(unittest.TestCase):
@@ -24,4 +26,59 @@ class TestLabelGraph(unittest.TestCase):
         vert, d = index2dim(w, v)
         print(vert)
         assert vert is v
-        assert d == 1
\ No newline at end of file
+        assert d == 1
+
+
+class TestSuggestChunkShape(unittest.TestCase):
+
+    def testIsotropic(self):
+        shape = suggestChunkShape((1000, 1000, 1000), np.uint8)
+        assert shape == (64, 64, 64), str(shape)
+
+    def testSmallAxes(self):
+        # axes that are smaller than the chunk are taken completely
+        shape = suggestChunkShape((1000, 1000, 3), np.uint8)
+        assert shape[2] == 3, str(shape)
+        shape = suggestChunkShape((10, 20, 30), np.uint8)
+        assert shape == (10, 20, 30), str(shape)
+
+    def testBlockShape(self):
+        shape = suggestChunkShape((1000, 1000, 1000), np.uint8,
+                                  blockShape=(30, 0, 100))
+        assert shape[0] % 30 == 0, str(shape)
+        assert shape[2] == 100, str(shape)
+
+    def testDensity(self):
+        sparse = suggestChunkShape((1000, 1000, 1000), np.uint8, density=0.0)
+        dense = suggestChunkShape((1000, 1000, 1000), np.uint8, density=1.0)
+        assert np.prod(sparse) < np.prod(dense)
+
+
+class TestSnapToBlockShape(unittest.TestCase):
+
+    def testSnap(self):
+        shape = snapToBlockShape((100, 10, 7), (64, 64, 0), (1000, 1000, 10))
+        assert shape == (128, 64, 7), str(shape)
+
+    def testVolumeBoundary(self):
+        shape = snapToBlockShape((100, 10, 7), (64, 64, 5), (100, 20, 3))
+        assert shape == (100, 20, 3), str(shape)
+
+    def testNoBlocks(self):
+        shape = snapToBlockShape((100, 10, 7), None, (1000, 1000, 10))
+        assert shape == (100, 10, 7), str(shape)
+
+
+class TestUniquePairs(unittest.TestCase):
+
+    def testUnique(self):
+        a = np.asarray([3, 1, 3, 1, 2**32-1], dtype=np.uint32)
+        b = np.asarray([1, 2, 1, 1, 7], dtype=np.uint32)
+        ua, ub = uniquePairs(a, b)
+        assert ua.dtype == np.uint32 and ub.dtype == np.uint32
+        np.testing.assert_array_equal(ua, [1, 1, 3, 2**32-1])
+        np.testing.assert_array_equal(ub, [1, 2, 1, 7])
+
+    def testEmpty(self):
+        ua, ub = uniquePairs(np.zeros((0,)), np.zeros((0,)))
+        assert ua.size == 0 and ub.size == 0